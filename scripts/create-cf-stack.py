@@ -482,10 +482,18 @@ if args.dry_run:
 con_cf.create_stack(STACK_ID, template_body=json_body,
                     parameters=parameters, timeout_in_minutes=args.timeout)
 
+# check the stack soon, then less and less often (with some jitter to spread the API calls),
+# and give up if the stack hasn't been created or rolled back long after the timeout
 is_complete = False
 result = False
+delay = 5
+deadline = time.time() + args.timeout * 60 + 600
 while not is_complete:
-    time.sleep(10)
+    if time.time() >= deadline:
+        logging.error("Stack creation hasn't finished in time")
+        break
+    time.sleep(min(delay * random.uniform(0.9, 1.1), max(deadline - time.time(), 0)))
+    delay = min(delay * 2, 60)
     try:
         for event in con_cf.describe_stack_events(STACK_ID):
             if event.resource_type == "AWS::CloudFormation::Stack" and event.resource_status == "CREATE_COMPLETE":
@@ -0,0 +1,114 @@
+'''ANSI escape sequence filter tests (offline)'''
+
+#! /usr/bin/python -tt
+
+import nose, logging
+
+from rhui3_tests_lib.channelfilter import AnsiFilter, FilteredChannel
+
+from os.path import basename
+
+logging.basicConfig(level=logging.DEBUG)
+
+# colored text with a cursor movement and an OSC window title
+COLORED = b'\x1b]0;root@rhua:~\x07rhui (\x1b[1;32mrepo\x1b[0m) => \x1b[2K\x1b[1G' + \
+          b'Last Result: \x1b[92mSuccess\x1b[0m\r\n'
+PLAIN = b'rhui (repo) => Last Result: Success\r\n'
+
+class _Channel(object):
+    '''
+       a channel receiving the given chunks
+    '''
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def recv(self, nbytes):
+        return self.chunks.pop(0) if self.chunks else b''
+
+def setup():
+    '''
+       announce the beginning of the test run
+    '''
+    print("*** Running %s: *** " % basename(__file__))
+
+def _filter(chunks):
+    '''
+       return the filtered chunks joined, and the filter
+    '''
+    ansi = AnsiFilter()
+    return b''.join([ansi.feed(chunk) for chunk in chunks]), ansi
+
+def test_01_plain_text():
+    '''
+        check that text without escape sequences passes through unchanged
+    '''
+    text, ansi = _filter([PLAIN, b'[root@rhua ~]# ', b'a [bracket] and ] stray ; chars'])
+    nose.tools.assert_equal(text, PLAIN + b'[root@rhua ~]# a [bracket] and ] stray ; chars')
+    nose.tools.assert_equal(ansi.pending, b'')
+
+def test_02_whole_sequences():
+    '''
+        strip the sequences received in one piece
+    '''
+    text, _ = _filter([COLORED])
+    nose.tools.assert_equal(text, PLAIN)
+
+def test_03_split_sequences():
+    '''
+        strip the sequences split across the receives at every position
+    '''
+    for position in range(1, len(COLORED)):
+        text, ansi = _filter([COLORED[:position], COLORED[position:]])
+        nose.tools.assert_equal(text, PLAIN, "split at %s" % position)
+        nose.tools.assert_equal(ansi.pending, b'')
+
+def test_04_byte_by_byte():
+    '''
+        strip the sequences received one byte at a time
+    '''
+    text, _ = _filter([COLORED[position:position + 1] for position in range(len(COLORED))])
+    nose.tools.assert_equal(text, PLAIN)
+
+def test_05_split_osc():
+    '''
+        strip an OSC terminated by ESC \\ with the terminator split across the receives
+    '''
+    text, _ = _filter([b'a\x1b]2;title\x1b', b'\\b'])
+    nose.tools.assert_equal(text, b'ab')
+
+def test_06_lone_escape():
+    '''
+        hold back an ESC at the end of a receive until the next one
+    '''
+    ansi = AnsiFilter()
+    nose.tools.assert_equal(ansi.feed(b'Success\x1b'), b'Success')
+    nose.tools.assert_equal(ansi.pending, b'\x1b')
+    nose.tools.assert_equal(ansi.feed(b'[0m\r\n'), b'\r\n')
+    # an ESC followed by a byte that can't go on a sequence is dropped
+    nose.tools.assert_equal(ansi.feed(b'a\x1b'), b'a')
+    nose.tools.assert_equal(ansi.feed(b'\x01b'), b'\x01b')
+
+def test_07_unterminated_osc():
+    '''
+        give up on holding back an OSC that never ends
+    '''
+    ansi = AnsiFilter()
+    text = ansi.feed(b'\x1b]0;' + b'x' * AnsiFilter.max_pending)
+    nose.tools.assert_equal(ansi.pending, b'')
+    nose.tools.assert_equal(text, b']0;' + b'x' * AnsiFilter.max_pending)
+
+def test_08_filtered_channel():
+    '''
+        receive through a filtered channel: a receive of only a sequence waits for more
+    '''
+    channel = FilteredChannel(_Channel([b'\x1b[92m', b'Success\x1b[', b'0m\r\n']))
+    nose.tools.assert_equal(channel.recv(1024), b'Success')
+    nose.tools.assert_equal(channel.recv(1024), b'\r\n')
+    nose.tools.assert_equal(channel.received, len(b'\x1b[92mSuccess\x1b[0m\r\n'))
+    nose.tools.assert_equal(channel.recv(1024), b'')
+
+def test_09_strip():
+    '''
+        strip the sequences from a text
+    '''
+    nose.tools.assert_equal(AnsiFilter.strip(COLORED.decode("ascii")), PLAIN.decode("ascii"))
@@ -25,6 +25,8 @@ def test_01_initial_run():
         log in to RHUI
     '''
     RHUIManager.initial_run(connection)
+    # only rhui-manager screens are used in this module, keep rhui-manager running
+    RHUIManagerSession.get(connection).keep_alive = True
 
 def test_02_list_empty_hap():
     '''
@@ -76,4 +78,5 @@ def teardown():
     '''
        announce the end of the test run
     '''
+    RHUIManagerSession.get(connection).close()
     print("*** Finished running %s. *** " % basename(__file__))
@@ -0,0 +1,83 @@
+'''Instrumentation tests (offline, against the simulated rhui-manager)'''
+
+#! /usr/bin/python -tt
+
+import nose, logging
+
+from stitches.expect import Expect
+from rhui3_tests_lib.instrumentation import Instrumentation
+from rhui3_tests_lib.promptscanner import PromptScanner
+from rhui3_tests_lib.rhuimanager import RHUIManager, screen_prompt
+from rhui3_tests_lib.simulator import SimulatedConnection, SimulatedRHUA
+from rhui3_tests_lib.syncstatus import SyncStatusTable
+
+from os.path import basename
+
+logging.basicConfig(level=logging.DEBUG)
+
+CONNECTION = SimulatedConnection(SimulatedRHUA(custom_repos=3))
+
+def setup():
+    '''
+       announce the beginning of the test run, enable the instrumentation
+    '''
+    print("*** Running %s: *** " % basename(__file__))
+    Instrumentation.enable()
+
+def teardown():
+    '''
+       disable the instrumentation, drop the records
+    '''
+    Instrumentation.disable()
+    Instrumentation.reset()
+
+def _recorded(name, function, *args):
+    '''
+       call the function as a recorded call, return (its result, the record)
+    '''
+    result = Instrumentation._timed(name, function)(*args)
+    record = [record for record in Instrumentation.records if record.name == name][-1]
+    return result, record
+
+def _check(record):
+    '''
+       check that the reading has been recorded as one round trip
+    '''
+    nose.tools.assert_equal(record.round_trips, 1)
+    nose.tools.assert_true(record.bytes_received > 0)
+    nose.tools.assert_true(record.blocked > 0)
+
+def test_01_read_nth():
+    '''
+        record a read of the n-th prompt
+    '''
+    RHUIManager.screen(CONNECTION, "repo")
+    Expect.enter(CONNECTION, "l")
+    _, record = _recorded("test.read_nth", PromptScanner([screen_prompt("repo")]).read_nth, CONNECTION, 1)
+    RHUIManager.release(CONNECTION)
+    _check(record)
+
+def test_02_lines():
+    '''
+        record the steps of a streamed reading
+    '''
+    RHUIManager.screen(CONNECTION, "repo")
+    Expect.enter(CONNECTION, "l")
+    lines, record = _recorded("test.lines", lambda connection: list(PromptScanner([screen_prompt("repo")]).lines(connection)),
+                              CONNECTION)
+    RHUIManager.release(CONNECTION)
+    nose.tools.assert_true("  custom-00002" in lines)
+    _check(record)
+
+def test_03_sync_summary():
+    '''
+        record a reading of the sync summary
+    '''
+    RHUIManager.screen(CONNECTION, "sync")
+    Expect.enter(CONNECTION, "dr")
+    table = SyncStatusTable()
+    _, record = _recorded("test.summary", table.read, CONNECTION, ["custom-00002"])
+    Expect.enter(CONNECTION, "\x03")
+    RHUIManager.quit(CONNECTION)
+    nose.tools.assert_equal(table.find("custom-00002").result, "Never")
+    _check(record)
@@ -0,0 +1,91 @@
+'''Pattern cache and label matching tests (offline, partly against the simulated rhui-manager)'''
+
+#! /usr/bin/python -tt
+
+import nose, logging
+
+from stitches.expect import Expect
+from rhui3_tests_lib.patterncache import PatternCache
+from rhui3_tests_lib.rhuimanager import RHUIManager, label_pattern
+from rhui3_tests_lib.rhuimanager_repo import RHUIManagerRepo
+from rhui3_tests_lib.simulator import SimulatedConnection, SimulatedRHUA
+
+from os.path import basename
+
+logging.basicConfig(level=logging.DEBUG)
+
+# the end of a label as matched by RHUIManager.select() in the batch mode
+LABEL_END = "(?:^|\\s)%s\\s*$"
+REDHAT_REPO = "Red Hat Simulated Product 00001 (RPMs) (7Server-x86_64)"
+
+def setup():
+    '''
+       announce the beginning of the test run
+    '''
+    print("*** Running %s: *** " % basename(__file__))
+
+def _connection():
+    '''
+       return a connection to a simulated RHUA with rhui-manager set up
+    '''
+    connection = SimulatedConnection(SimulatedRHUA(custom_repos=1, redhat_repos=3))
+    RHUIManager.initial_run(connection)
+    return connection
+
+def test_01_literal():
+    '''
+        check that the value is filled in literally
+    '''
+    cache = PatternCache()
+    pattern = cache.get("^%s$", "repo.1 (RPMs) [x+y]")
+    nose.tools.assert_true(pattern.match("repo.1 (RPMs) [x+y]"))
+    nose.tools.assert_false(pattern.match("repoX1 (RPMs) [x+y]"))
+
+def test_02_lru():
+    '''
+        check the hits, the misses and the eviction of the least recently used pattern
+    '''
+    cache = PatternCache(size=2)
+    first = cache.get("^%s$", "a")
+    cache.get("^%s$", "b")
+    nose.tools.assert_true(cache.get("^%s$", "a") is first)
+    cache.get("^%s$", "c")
+    nose.tools.assert_true(cache.get("^%s$", "a") is first)
+    nose.tools.assert_equal(cache.stats(), {"size": 2, "hits": 2, "misses": 3})
+    cache.get("^%s$", "b")
+    nose.tools.assert_equal(cache.stats()["misses"], 4)
+
+def test_03_label_pattern():
+    '''
+        match the end of labels, and their beginning with a wildcard value
+    '''
+    nose.tools.assert_true(label_pattern(LABEL_END, "(RPMs) (7Server-x86_64)", 0).search(REDHAT_REPO))
+    nose.tools.assert_false(label_pattern(LABEL_END, "Red Hat Simulated Product 00001", 0).search(REDHAT_REPO))
+    nose.tools.assert_true(label_pattern(LABEL_END, "Red Hat Simulated Product 00001.*", 0).search(REDHAT_REPO))
+    nose.tools.assert_false(label_pattern(LABEL_END, "Red Hat Simulated Product 0000..*", 0).search(REDHAT_REPO))
+
+def test_04_select_wildcard():
+    '''
+        delete a repo selected by the beginning of its label
+    '''
+    connection = _connection()
+    RHUIManagerRepo.list(connection)
+    RHUIManagerRepo.delete_repo(connection, ["Red Hat Simulated Product 00001.*"])
+    nose.tools.assert_equal([repo["name"] for repo in connection.rhua.repos],
+                            ["Red Hat Simulated Product 00000 (RPMs) (7Server-x86_64)",
+                             "Red Hat Simulated Product 00002 (RPMs) (7Server-x86_64)",
+                             "custom-00000"])
+    nose.tools.assert_equal(len(RHUIManagerRepo.list(connection)), 3)
+
+def test_05_select_one_by_one():
+    '''
+        select repos one by one, by the whole label and by the beginning of one
+    '''
+    connection = _connection()
+    RHUIManager.screen(connection, "repo")
+    Expect.enter(connection, "d")
+    RHUIManager.select(connection, [REDHAT_REPO, "custom.*"], batch=False)
+    RHUIManager.proceed_with_check(connection, "The following repositories will be deleted:",
+                                   [REDHAT_REPO, "custom-00000"])
+    RHUIManager.quit(connection)
+    nose.tools.assert_equal(len(connection.rhua.repos), 2)
@@ -0,0 +1,62 @@
+'''rhui-manager session tests (offline, against the simulated rhui-manager)'''
+
+#! /usr/bin/python -tt
+
+import nose, logging
+
+from stitches.expect import ExpectFailed
+from rhui3_tests_lib.rhuimanager import RHUIManager, RHUIManagerSession
+from rhui3_tests_lib.rhuimanager_repo import RHUIManagerRepo
+from rhui3_tests_lib.simulator import SimulatedConnection, SimulatedRHUA
+
+from os.path import basename
+
+logging.basicConfig(level=logging.DEBUG)
+
+def setup():
+    '''
+       announce the beginning of the test run
+    '''
+    print("*** Running %s: *** " % basename(__file__))
+
+def _session(keep_alive):
+    '''
+       return a connection to a simulated RHUA with rhui-manager set up, and its session
+    '''
+    connection = SimulatedConnection(SimulatedRHUA(custom_repos=3))
+    RHUIManager.initial_run(connection)
+    session = RHUIManagerSession.get(connection)
+    session.keep_alive = keep_alive
+    return connection, session
+
+def _check_recovery(keep_alive):
+    '''
+       fail an operation halfway, check that the next operation works
+    '''
+    connection, session = _session(keep_alive)
+    RHUIManagerRepo.list(connection)
+    # the selection of a repo that doesn't exist fails in the deletion dialog
+    nose.tools.assert_raises(ExpectFailed, RHUIManagerRepo.delete_repo, connection, ["custom-99999"])
+    nose.tools.assert_equal(session.current, None)
+    nose.tools.assert_equal(RHUIManagerRepo.list(connection), ["custom-00000", "custom-00001", "custom-00002"])
+
+def test_01_recover_kept_alive():
+    '''
+        recover from a failed operation in a session kept alive
+    '''
+    _check_recovery(True)
+
+def test_02_recover():
+    '''
+        recover from a failed operation in a session quit after every operation
+    '''
+    _check_recovery(False)
+
+def test_03_keep_alive():
+    '''
+        check that a session kept alive stays on the screen after an operation
+    '''
+    connection, session = _session(True)
+    RHUIManagerRepo.list(connection)
+    nose.tools.assert_equal(session.current, "repo")
+    nose.tools.assert_false(session.busy)
@@ -0,0 +1,148 @@
+'''Sync status parsing tests (offline)'''
+
+#! /usr/bin/python -tt
+
+import nose, logging
+
+from stitches.expect import ExpectFailed
+from rhui3_tests_lib.rhuimanager import RHUIManager, RHUIManagerSession
+from rhui3_tests_lib.rhuimanager_repo import RHUIManagerRepo
+from rhui3_tests_lib.rhuimanager_sync import RHUIManagerSync, SyncTaskMonitor
+from rhui3_tests_lib.simulator import SimulatedConnection, SimulatedRHUA
+from rhui3_tests_lib.syncstatus import SyncStatusTable
+from rhui3_tests_lib.util import Util
+
+from os.path import basename
+
+logging.basicConfig(level=logging.DEBUG)
+
+# the output of "rhui-manager status" with dot leaders and colored results
+CLI_STATUS = "Repository Sync Status\n" + \
+             "Red Hat Update Infrastructure 2 (RPMs) (6Server-x86_64) .............. [ \x1b[92mSuccess\x1b[0m ]\n" + \
+             "Red Hat Update Infrastructure 2 (RPMs) (6Server-x86_64) (Debug) ...... [ \x1b[93mRunning\x1b[0m ]\n" + \
+             "Custom Repo Never Synced In May .................................... [ Never ]\n" + \
+             "\n" + \
+             "Entitlement CA certificate expiration date = 01-01-2038 ........ [ OK ]\n"
+
+# the beginning of a redraw of the sync summary and its header
+SUMMARY_HEADER = "\r\nLast Refreshed: 10:11:12\r\n" + \
+                 "(updated every 5 seconds, ctrl+c to exit)\r\n\r\n" + \
+                 "Next Sync                    Last Sync                    Last Result\r\n" + \
+                 "-" * 78 + "\r\n"
+# a repo of the sync summary: the name and the values in the columns
+SUMMARY_ROW = "%s\r\n%-29s%-29s%s\r\n\r\n"
+DEBUG_REPO = "Red Hat Update Infrastructure 3 (Debug RPMs) from RHUI (7Server-x86_64)"
+
+def setup():
+    '''
+       announce the beginning of the test run
+    '''
+    print("*** Running %s: *** " % basename(__file__))
+
+def _monitor(output):
+    '''
+       return a monitor that has read the output
+    '''
+    monitor = SyncTaskMonitor(None)
+    monitor.lines = Util.uncolorify(output).splitlines()
+    monitor.results = SyncTaskMonitor.parse(monitor.lines)
+    return monitor
+
+def test_01_cli_status():
+    '''
+        parse the results of the repos in the status
+    '''
+    monitor = _monitor(CLI_STATUS)
+    nose.tools.assert_equal(monitor.status("Red Hat Update Infrastructure 2 (RPMs) (6Server-x86_64)"), "Success")
+    nose.tools.assert_equal(monitor.status("Red Hat Update Infrastructure 2 (RPMs) (6Server-x86_64) (Debug)"), "Running")
+    nose.tools.assert_equal(monitor.status("Custom Repo Never Synced In May"), "Never")
+
+def test_02_cli_status_partial_name():
+    '''
+        check that a part of a repo name doesn't match
+    '''
+    monitor = _monitor(CLI_STATUS)
+    nose.tools.assert_equal(monitor.status("Red Hat Update Infrastructure 2 (RPMs)"), "Unknown")
+    nose.tools.assert_equal(monitor.status("Custom Repo"), "Unknown")
+
+def test_03_simulated_cli_status():
+    '''
+        parse the status printed by the simulated rhui-manager
+    '''
+    rhua = SimulatedRHUA(custom_repos=2, redhat_repos=1)
+    rhua.find_repo("custom-00001")["result"] = "Error"
+    monitor = _monitor(rhua.run("rhui-manager status")[1])
+    nose.tools.assert_equal(monitor.results,
+                            {"custom-00000": "Never",
+                             "custom-00001": "Error",
+                             "Red Hat Simulated Product 00000 (RPMs) (7Server-x86_64)": "Never",
+                             "Entitlement CA certificate expiration date = 01-01-2038": "OK"})
+
+def _table(*texts):
+    '''
+       return a table that has been fed the texts
+    '''
+    table = SyncStatusTable()
+    for text in texts:
+        table.feed(text)
+    return table
+
+def test_04_summary_columns():
+    '''
+        parse the values of the repos by the columns of the header
+    '''
+    table = _table(SUMMARY_HEADER +
+                   SUMMARY_ROW % ("custom-1", "07-05-2018 19:43", "07-05-2018 13:43", "Success") +
+                   SUMMARY_ROW % ("custom-2", "In Progress", "Never", "Running"))
+    nose.tools.assert_equal(table.names, ["custom-1", "custom-2"])
+    status = table.find("custom-1")
+    nose.tools.assert_equal([status.next_sync, status.last_sync, status.result],
+                            ["07-05-2018 19:43", "07-05-2018 13:43", "Success"])
+    status = table.find("custom-2")
+    nose.tools.assert_equal([status.next_sync, status.last_sync, status.result],
+                            ["In Progress", "Never", "Running"])
+
+def test_05_summary_redraws():
+    '''
+        check that the statuses are those of the latest redraw, fed in pieces
+    '''
+    text = SUMMARY_HEADER + SUMMARY_ROW % ("custom-1", "In Progress", "Never", "Running") + \
+           SUMMARY_HEADER + SUMMARY_ROW % ("custom-1", "07-05-2018 19:43", "07-05-2018 13:43", "Success")
+    table = _table(*[text[start:start + 7] for start in range(0, len(text), 7)])
+    nose.tools.assert_equal(table.redraws, 2)
+    nose.tools.assert_equal(table.listed, ["custom-1"])
+    nose.tools.assert_equal(table.find("custom-1").result, "Success")
+
+def test_06_summary_wrapped_name():
+    '''
+        parse a repo name wrapped over two lines
+    '''
+    table = _table(SUMMARY_HEADER +
+                   SUMMARY_ROW % ("Red Hat Update Infrastructure 3 (Debug RPMs)\r\nfrom RHUI (7Server-x86_64)",
+                                  "Not Scheduled", "Never", "Never") +
+                   SUMMARY_ROW % ("custom-1", "In Progress", "Never", "Running"))
+    nose.tools.assert_equal(table.names, [DEBUG_REPO, "custom-1"])
+    nose.tools.assert_equal(table.find(DEBUG_REPO).result, "Never")
+    nose.tools.assert_equal(table.find("custom-1").result, "Running")
+
+def test_07_summary_exact_name():
+    '''
+        check that the end of a repo name doesn't match, and that a missing repo is reported
+    '''
+    table = _table(SUMMARY_HEADER +
+                   SUMMARY_ROW % ("\x1b[1m" + DEBUG_REPO + "\x1b[0m", "Not Scheduled", "Never", "Never"))
+    nose.tools.assert_equal(table.find(DEBUG_REPO).result, "Never")
+    nose.tools.assert_equal(table.find("from RHUI (7Server-x86_64)"), None)
+    nose.tools.assert_raises(ExpectFailed, table.status, "from RHUI (7Server-x86_64)")
+
+def test_08_simulated_missing_repo():
+    '''
+        read the status of a repo that isn't listed, check that the read fails
+        after a complete redraw and that the next read works
+    '''
+    connection = SimulatedConnection(SimulatedRHUA(custom_repos=2, refresh=0.2))
+    RHUIManager.initial_run(connection)
+    nose.tools.assert_raises(ExpectFailed, RHUIManagerSync.get_repo_status, connection, "custom-0000")
+    nose.tools.assert_equal(RHUIManagerSession.get(connection).current, None)
+    nose.tools.assert_equal(RHUIManagerSync.get_repo_status(connection, "custom-00001")[2], "Never")
+    nose.tools.assert_equal(RHUIManagerRepo.list(connection), ["custom-00000", "custom-00001"])
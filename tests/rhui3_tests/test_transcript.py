@@ -0,0 +1,63 @@
+'''Recording and replaying tests (offline, against the simulated rhui-manager)'''
+
+#! /usr/bin/python -tt
+
+import nose, logging
+
+from stitches.expect import Expect
+from rhui3_tests_lib.rhuimanager import RHUIManager
+from rhui3_tests_lib.rhuimanager_repo import RHUIManagerRepo
+from rhui3_tests_lib.simulator import SimulatedConnection, SimulatedRHUA
+from rhui3_tests_lib.transcript import ReplayConnection, ReplayMismatch, Transcript
+
+from os.path import basename
+
+logging.basicConfig(level=logging.DEBUG)
+
+def setup():
+    '''
+       announce the beginning of the test run
+    '''
+    print("*** Running %s: *** " % basename(__file__))
+
+def _record(operation):
+    '''
+       record the operation on a simulated RHUA, return the transcript
+    '''
+    connection = SimulatedConnection(SimulatedRHUA(custom_repos=3))
+    transcript = Transcript.record(connection)
+    operation(connection)
+    transcript.stop()
+    return transcript
+
+def test_01_replay_expect_retval():
+    '''
+        replay a command run with expect_retval
+    '''
+    transcript = _record(lambda connection: Expect.expect_retval(connection, "true"))
+    nose.tools.assert_equal([event["event"] for event in transcript.events], ["status"])
+    Expect.expect_retval(ReplayConnection(transcript), "true")
+
+def test_02_replay_mismatch():
+    '''
+        check that a different command doesn't replay, and that the message says why
+    '''
+    transcript = _record(lambda connection: Expect.expect_retval(connection, "true"))
+    try:
+        Expect.expect_retval(ReplayConnection(transcript), "false")
+    except ReplayMismatch as error:
+        nose.tools.assert_in("'false' (status)", str(error))
+        nose.tools.assert_in("'true' (status)", str(error))
+    else:
+        raise AssertionError("the replay of a different command didn't fail")
+
+def test_03_replay_repo_list():
+    '''
+        replay a repo listing including the initial run
+    '''
+    def operation(connection):
+        RHUIManager.initial_run(connection)
+        return RHUIManagerRepo.list(connection)
+    transcript = _record(operation)
+    nose.tools.assert_equal(operation(ReplayConnection(transcript)),
+                            ["custom-00000", "custom-00001", "custom-00002"])
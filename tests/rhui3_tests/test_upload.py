@@ -0,0 +1,113 @@
+'''Content upload tests (offline, against the simulated rhui-manager)'''
+
+#! /usr/bin/python -tt
+
+import nose, logging
+
+import glob, os, shutil, tempfile
+
+from stitches.expect import ExpectFailed
+from rhui3_tests_lib.rhuimanager import RHUIManager, RHUIManagerSession
+from rhui3_tests_lib.rhuimanager_repo import RHUIManagerRepo
+from rhui3_tests_lib.simulator import SimulatedConnection, SimulatedRHUA
+
+from os.path import basename
+
+logging.basicConfig(level=logging.DEBUG)
+
+PACKAGES = ["pkg-%s-1.0-1.noarch.rpm" % index for index in range(5)]
+
+def setup():
+    '''
+       announce the beginning of the test run
+    '''
+    print("*** Running %s: *** " % basename(__file__))
+
+def _chunk_dirs():
+    '''
+       return the chunk directories currently in /tmp
+    '''
+    return set(glob.glob("/tmp/rhui3-upload-*"))
+
+def _upload(repolist, chunk_size):
+    '''
+       upload a directory with the packages and a file that isn't a package to a simulated RHUA,
+       return the connection, the chunk directories left behind and the result or the exception
+    '''
+    directory = tempfile.mkdtemp()
+    for name in PACKAGES + ["README"]:
+        with open(os.path.join(directory, name), "w") as package:
+            package.write(name)
+    connection = SimulatedConnection(SimulatedRHUA(custom_repos=2))
+    RHUIManager.initial_run(connection)
+    before = _chunk_dirs()
+    try:
+        result = RHUIManagerRepo.upload_content(connection, repolist, directory, chunk_size)
+    except Exception as err:
+        result = err
+    finally:
+        shutil.rmtree(directory)
+    return connection, _chunk_dirs() - before, result
+
+def test_01_upload_in_chunks():
+    '''
+        upload the packages in chunks, check that all are uploaded and the chunks removed
+    '''
+    connection, left, stats = _upload(["custom-00001"], 2)
+    nose.tools.assert_equal(stats["files"], len(PACKAGES))
+    nose.tools.assert_equal(stats["bytes"], sum([len(name) for name in PACKAGES]))
+    nose.tools.assert_equal(connection.rhua.repos[1]["packages"], PACKAGES)
+    nose.tools.assert_equal(connection.rhua.repos[0]["packages"], [])
+    nose.tools.assert_equal(left, set())
+
+def test_02_upload_at_once():
+    '''
+        upload the packages without chunks
+    '''
+    connection, left, stats = _upload(["custom-00000"], None)
+    nose.tools.assert_equal(stats["files"], len(PACKAGES))
+    nose.tools.assert_equal(connection.rhua.repos[0]["packages"], PACKAGES)
+    nose.tools.assert_equal(left, set())
+
+def test_03_failed_cleanup():
+    '''
+        fail the upload of a chunk and the removal of its directory, check that the upload error
+        is raised and that the session is recovered
+    '''
+    def rmdir(path):
+        raise IOError("Permission denied: %s" % path)
+    original = SimulatedConnection.__init__
+    def init(self, *args, **kwargs):
+        original(self, *args, **kwargs)
+        self.sftp.rmdir = rmdir
+    SimulatedConnection.__init__ = init
+    try:
+        connection, left, err = _upload(["custom-99999"], 2)
+    finally:
+        SimulatedConnection.__init__ = original
+        for path in _chunk_dirs():
+            if not os.listdir(path):
+                os.rmdir(path)
+    nose.tools.assert_true(isinstance(err, ExpectFailed), repr(err))
+    # the links were removed, the directory stayed
+    nose.tools.assert_equal(len(left), 1)
+    nose.tools.assert_equal(RHUIManagerSession.get(connection).current, None)
+    nose.tools.assert_equal(RHUIManagerRepo.list(connection), ["custom-00000", "custom-00001"])
+
+def test_04_failed_link():
+    '''
+        fail the linking of a chunk, check that the error is raised and nothing is left behind
+    '''
+    original = os.symlink
+    def symlink(source, dest):
+        if source.endswith(PACKAGES[1]):
+            raise OSError("No space left on device")
+        original(source, dest)
+    os.symlink = symlink
+    try:
+        connection, left, err = _upload(["custom-00000"], 2)
+    finally:
+        os.symlink = original
+    nose.tools.assert_true(isinstance(err, OSError), repr(err))
+    nose.tools.assert_equal(left, set())
+    nose.tools.assert_equal(connection.rhua.repos[0]["packages"], [])
@@ -0,0 +1,141 @@
+'''Waiter tests (offline, with a simulated clock)'''
+
+#! /usr/bin/python -tt
+
+import nose, logging
+
+import random, time
+
+from rhui3_tests_lib import waiter
+from rhui3_tests_lib.waiter import Waiter, WaitTimeout, WaitCancelled
+
+from os.path import basename
+
+logging.basicConfig(level=logging.DEBUG)
+
+class _Clock(object):
+    '''
+       a clock that only advances when sleeping; the jitter is always the given fraction
+       (it stands for the time and random modules in the waiter module)
+    '''
+    def __init__(self, jitter=0.0):
+        self.now = 1000.0
+        self.sleeps = []
+        self.jitter = jitter
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def uniform(self, low, high):
+        return max(low, min(high, self.jitter))
+
+CLOCK = None
+
+def setup():
+    '''
+       announce the beginning of the test run
+    '''
+    print("*** Running %s: *** " % basename(__file__))
+
+def _install():
+    '''
+       make the waiter use a new simulated clock, return it
+    '''
+    global CLOCK
+    CLOCK = _Clock()
+    waiter.time = waiter.random = CLOCK
+    return CLOCK
+
+def _restore():
+    '''
+       make the waiter use the real clock
+    '''
+    waiter.time = time
+    waiter.random = random
+
+def _after(seconds):
+    '''
+       return a condition met once the simulated clock has advanced by the seconds
+    '''
+    start = CLOCK.now
+    return lambda: CLOCK.now - start >= seconds
+
+@nose.tools.with_setup(_install, _restore)
+def test_01_immediate():
+    '''
+        check that a condition met at once is checked once, without sleeping
+    '''
+    wait = Waiter(timeout=10)
+    nose.tools.assert_equal(wait.until(lambda value: value, "done"), "done")
+    nose.tools.assert_equal(CLOCK.sleeps, [])
+    nose.tools.assert_equal(wait.stats(), {"checks": 1, "slept": 0.0, "elapsed": 0.0})
+
+@nose.tools.with_setup(_install, _restore)
+def test_02_backoff_cap():
+    '''
+        check that the delays grow by the factor up to the maximum
+    '''
+    wait = Waiter(first=1, maximum=10, factor=3, jitter=0.5)
+    wait.until(_after(100))
+    nose.tools.assert_equal(CLOCK.sleeps[:6], [1, 3, 9, 10, 10, 10])
+    nose.tools.assert_equal(wait.checks, len(CLOCK.sleeps) + 1)
+    nose.tools.assert_equal(wait.slept, sum(CLOCK.sleeps))
+
+@nose.tools.with_setup(_install, _restore)
+def test_03_jitter():
+    '''
+        check that the jitter stretches the delays by at most the jitter fraction
+    '''
+    CLOCK.jitter = 0.5
+    wait = Waiter(first=2, maximum=8, factor=2, jitter=0.1)
+    wait.until(_after(20))
+    nose.tools.assert_equal([round(delay, 6) for delay in CLOCK.sleeps], [2.2, 4.4, 8.8, 8.8])
+
+@nose.tools.with_setup(_install, _restore)
+def test_04_deadline():
+    '''
+        check that no sleep goes past the deadline and that the wait then times out
+    '''
+    wait = Waiter(first=1, maximum=30, factor=2, timeout=20, name="nothing")
+    start = CLOCK.now
+    nose.tools.assert_raises(WaitTimeout, wait.until, lambda: False)
+    nose.tools.assert_equal(CLOCK.sleeps, [1, 2, 4, 8, 5])
+    nose.tools.assert_equal(CLOCK.now - start, 20)
+    nose.tools.assert_equal(wait.checks, 6)
+    nose.tools.assert_equal(wait.elapsed, 20)
+
+@nose.tools.with_setup(_install, _restore)
+def test_05_met_at_deadline():
+    '''
+        check that the condition is checked once more at the deadline
+    '''
+    wait = Waiter(first=1, maximum=30, factor=2, timeout=20)
+    nose.tools.assert_true(wait.until(_after(20)))
+    nose.tools.assert_equal(sum(CLOCK.sleeps), 20)
+
+@nose.tools.with_setup(_install, _restore)
+def test_06_cancel():
+    '''
+        check that a cancelled wait stops before sleeping
+    '''
+    checks = []
+    wait = Waiter(cancel=lambda: len(checks) >= 3)
+    nose.tools.assert_raises(WaitCancelled, wait.until, lambda: checks.append(1))
+    nose.tools.assert_equal(len(checks), 3)
+    nose.tools.assert_equal(CLOCK.sleeps, [1, 2])
+
+@nose.tools.with_setup(_install, _restore)
+def test_07_timeout_message():
+    '''
+        check that the timeout names the condition and the timeout
+    '''
+    try:
+        Waiter(timeout=5, name="the repo to appear").until(lambda: False)
+    except WaitTimeout as err:
+        nose.tools.assert_equal(str(err), "Waiting for the repo to appear timed out after 5 seconds")
+    else:
+        raise AssertionError("WaitTimeout not raised")
@@ -0,0 +1,94 @@
+""" Filtering of the output received over the interactive shell channel """
+
+import re
+
+# complete escape sequences: CSI (colors and cursor movement), OSC, and two-byte ones
+ESCAPE_PATTERN = re.compile(b'\x1b(?:\\[[0-?]*[ -/]*[@-~]|\\][^\x07\x1b]*(?:\x07|\x1b\\\\)|(?![\\[\\]])[ -/]*[0-~])')
+# the beginning of an escape sequence cut off by the end of the data received so far
+PARTIAL_ESCAPE_PATTERN = re.compile(b'\x1b(?:\\[[0-?]*[ -/]*|\\][^\x07\x1b]*\x1b?|[ -/]*)\\Z')
+# text variant for strings that didn't go through a filtered channel
+ESCAPE_TEXT_PATTERN = re.compile('\x1b(?:\\[[0-?]*[ -/]*[@-~]|\\][^\x07\x1b]*(?:\x07|\x1b\\\\)|(?![\\[\\]])[ -/]*[0-~])')
+
+class AnsiFilter(object):
+    '''
+    Incrementally strip ANSI escape sequences from a byte stream.
+
+    Sequences split across reads are held back until the rest arrives.
+    '''
+    # give up on holding back anything longer than this (an unterminated OSC, say)
+    max_pending = 256
+
+    def __init__(self):
+        self.pending = b''
+
+    def feed(self, data):
+        '''
+        return the data without escape sequences
+        '''
+        if self.pending:
+            data = self.pending + data
+            self.pending = b''
+        if b'\x1b' not in data:
+            return data
+        data = ESCAPE_PATTERN.sub(b'', data)
+        # hold back an unfinished sequence from its start (not from its last ESC, which
+        # may begin the "ESC \\" ending an OSC)
+        partial = PARTIAL_ESCAPE_PATTERN.search(data)
+        if partial is not None and len(data) - partial.start() < self.max_pending:
+            self.pending = data[partial.start():]
+            data = data[:partial.start()]
+        # whatever is left can't become a sequence
+        return data.replace(b'\x1b', b'')
+
+    @staticmethod
+    def strip(text):
+        '''
+        return the text without escape sequences
+        '''
+        return ESCAPE_TEXT_PATTERN.sub('', text).replace('\x1b', '')
+
+class FilteredChannel(object):
+    '''
+    A wrapper of the interactive shell channel of a connection; the received data is
+    passed through an AnsiFilter, so that every reader sees plain text.
+    Everything else is delegated to the wrapped channel.
+    '''
+    def __init__(self, channel):
+        self.channel = channel
+        self.filter = AnsiFilter()
+        # number of bytes received from the channel, escape sequences included
+        self.received = 0
+
+    def recv(self, nbytes):
+        '''
+        receive data from the channel, without escape sequences
+        '''
+        while True:
+            data = self.channel.recv(nbytes)
+            if not data:
+                # the channel has been closed
+                return data
+            self.received += len(data)
+            data = self.filter.feed(data)
+            if data:
+                return data
+            # all of it was an escape sequence, wait for more
+
+    def __getattr__(self, name):
+        return getattr(self.channel, name)
+
+    @staticmethod
+    def install(connection):
+        '''
+        make the shell channel of the connection filtered (if it isn't already)
+        return True if the channel has been replaced
+        '''
+        if isinstance(connection.channel, FilteredChannel):
+            return False
+        channel = FilteredChannel(connection.channel)
+        try:
+            connection.channel = channel
+        except AttributeError:
+            # the channel is a lazy property of stitches connections, cached in _lazy_channel
+            connection._lazy_channel = channel
+        return True
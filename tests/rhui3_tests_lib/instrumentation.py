@@ -0,0 +1,338 @@
+""" Opt-in timing instrumentation of the rhui-manager driving classes """
+
+import atexit
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+
+from stitches.connection import Connection
+from stitches.expect import Expect
+from rhui3_tests_lib.promptscanner import PromptScanner
+from rhui3_tests_lib.rhuimanager import RHUIManager
+from rhui3_tests_lib.rhuimanager_instance import RHUIManagerInstance
+from rhui3_tests_lib.rhuimanager_repo import RHUIManagerRepo
+from rhui3_tests_lib.rhuimanager_sync import RHUIManagerSync
+from rhui3_tests_lib.rhuimanagercli import CLIRunner, RHUIManagerCLI
+from rhui3_tests_lib.syncstatus import SyncStatusTable
+from rhui3_tests_lib.util import Util
+
+# the classes whose public static methods are timed
+INSTRUMENTED_CLASSES = [RHUIManager, RHUIManagerRepo, RHUIManagerSync,
+                        RHUIManagerInstance, RHUIManagerCLI, Util]
+
+# (class, method name, True if the method reads the interactive shell channel)
+# the calls that block waiting for the remote side; each of them is one round trip
+# (the generators too, the time spent in each step of them is added up)
+WAITING_METHODS = [(Expect, "expect_list", True),
+                   (Expect, "match", True),
+                   (PromptScanner, "read", True),
+                   (PromptScanner, "read_nth", True),
+                   (PromptScanner, "lines", True),
+                   (SyncStatusTable, "read", True),
+                   (Connection, "recv_exit_status", False),
+                   (Connection, "exec_command", False),
+                   (CLIRunner, "run", False)]
+
+class CallRecord(object):
+    '''
+    Statistics of a single call of an instrumented method.
+    '''
+    def __init__(self, name, depth):
+        self.name = name
+        self.depth = depth
+        self.thread = threading.current_thread().ident
+        self.start = time.time()
+        # seconds
+        self.wall = 0.0
+        self.blocked = 0.0
+        self.slept = 0.0
+        self.bytes_received = 0
+        self.round_trips = 0
+        self.error = None
+
+    def as_dict(self):
+        '''
+        return the record as a dictionary
+        '''
+        return {"name": self.name,
+                "depth": self.depth,
+                "thread": self.thread,
+                "start": self.start,
+                "wall": self.wall,
+                "blocked": self.blocked,
+                "slept": self.slept,
+                "bytes_received": self.bytes_received,
+                "round_trips": self.round_trips,
+                "error": self.error}
+
+class Instrumentation(object):
+    '''
+    Records the wall time, the time spent blocked on remote output, the time spent
+    sleeping, the number of bytes received over the shell channel and the number
+    of round trips (Expect waits, exec commands) of every call of the public static
+    methods of the INSTRUMENTED_CLASSES.
+
+    The instrumentation is off by default; enable() wraps the methods, disable()
+    puts the original ones back. Nested calls are recorded too, and their statistics
+    are included in the statistics of the calling method. The records can be exported
+    as JSON lines or as a Chrome trace event file (chrome://tracing, Perfetto).
+    '''
+    _lock = threading.Lock()
+    _local = threading.local()
+    # (owner, attribute name, original value)
+    _originals = []
+    records = []
+
+    @classmethod
+    def enabled(cls):
+        '''
+        return True if the instrumentation is on
+        '''
+        return bool(cls._originals)
+
+    @classmethod
+    def enable(cls, export_prefix=None):
+        '''
+        wrap the methods, start recording
+        if export_prefix is set, the records will be exported to export_prefix.jsonl
+        and export_prefix.trace.json when the program exits
+        '''
+        if export_prefix:
+            atexit.register(cls.export, export_prefix)
+        if cls.enabled():
+            return
+        for owner in INSTRUMENTED_CLASSES:
+            for name, value in list(vars(owner).items()):
+                if name.startswith("_") or not isinstance(value, staticmethod):
+                    continue
+                function = getattr(owner, name)
+                cls._patch(owner, name, staticmethod(cls._timed(owner.__name__ + "." + name, function)))
+        for owner, name, shell in WAITING_METHODS:
+            function = vars(owner)[name]
+            if isinstance(function, staticmethod):
+                cls._patch(owner, name, staticmethod(cls._waiting(getattr(owner, name), shell, False)))
+            else:
+                cls._patch(owner, name, cls._waiting(function, shell, True))
+        cls._patch(time, "sleep", cls._sleeping(time.sleep))
+        logging.debug("Instrumentation enabled")
+
+    @classmethod
+    def disable(cls):
+        '''
+        put the original methods back, stop recording; the records are kept
+        '''
+        while cls._originals:
+            owner, name, value = cls._originals.pop()
+            setattr(owner, name, value)
+        logging.debug("Instrumentation disabled")
+
+    @classmethod
+    def reset(cls):
+        '''
+        drop the records
+        '''
+        with cls._lock:
+            cls.records = []
+
+    @classmethod
+    def _patch(cls, owner, name, value):
+        '''
+        (internally used) replace an attribute, remember the original one
+        '''
+        cls._originals.append((owner, name, vars(owner)[name]))
+        setattr(owner, name, value)
+
+    @classmethod
+    def _stack(cls):
+        '''
+        (internally used) return the stack of the calls being recorded in this thread
+        '''
+        if not hasattr(cls._local, "stack"):
+            cls._local.stack = []
+            cls._local.waiting = False
+        return cls._local.stack
+
+    @classmethod
+    def _timed(cls, name, function):
+        '''
+        (internally used) return the function wrapped in a recorded call
+        '''
+        def wrapper(*args, **kwargs):
+            stack = cls._stack()
+            record = CallRecord(name, len(stack))
+            stack.append(record)
+            try:
+                return function(*args, **kwargs)
+            except BaseException as err:
+                record.error = err.__class__.__name__
+                raise
+            finally:
+                record.wall = time.time() - record.start
+                stack.pop()
+                with cls._lock:
+                    cls.records.append(record)
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+
+    @classmethod
+    def _waiting(cls, function, shell, method):
+        '''
+        (internally used) return the blocking function wrapped so that its time,
+        the bytes received and the round trip count are added to the calls being recorded
+        '''
+        if inspect.isgeneratorfunction(function):
+            return cls._waiting_generator(function, shell, method)
+
+        def wrapper(*args, **kwargs):
+            stack = cls._stack()
+            if not stack or cls._local.waiting:
+                return function(*args, **kwargs)
+            return cls._wait(stack, cls._channel(args, shell, method), 1, function, *args, **kwargs)
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+
+    @classmethod
+    def _waiting_generator(cls, function, shell, method):
+        '''
+        (internally used) return the blocking generator function wrapped so that the time
+        of every step, the bytes received meanwhile and one round trip are added to the calls
+        being recorded when the step is taken
+        '''
+        def wrapper(*args, **kwargs):
+            channel = cls._channel(args, shell, method)
+            iterator = function(*args, **kwargs)
+            round_trip = 1
+            try:
+                while True:
+                    stack = cls._stack()
+                    try:
+                        if not stack or cls._local.waiting:
+                            item = next(iterator)
+                        else:
+                            item = cls._wait(stack, channel, round_trip, next, iterator)
+                            round_trip = 0
+                    except StopIteration:
+                        return
+                    yield item
+            finally:
+                iterator.close()
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+
+    @staticmethod
+    def _channel(args, shell, method):
+        '''
+        (internally used) return the shell channel of the connection in the arguments
+        of a blocking call reading it, None if the call doesn't read it
+        '''
+        if not shell:
+            return None
+        # the connection is the first argument, after self in the case of methods
+        connection = args[1] if method else args[0]
+        return connection.channel
+
+    @classmethod
+    def _wait(cls, stack, channel, round_trips, function, *args, **kwargs):
+        '''
+        (internally used) call the blocking function, add its time, the bytes received
+        and the round trips to the calls in the stack
+        '''
+        received = getattr(channel, "received", 0)
+        cls._local.waiting = True
+        start = time.time()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            cls._local.waiting = False
+            blocked = time.time() - start
+            received = getattr(channel, "received", 0) - received
+            for record in stack:
+                record.blocked += blocked
+                record.bytes_received += received
+                record.round_trips += round_trips
+
+    @classmethod
+    def _sleeping(cls, function):
+        '''
+        (internally used) return time.sleep wrapped so that the time spent sleeping
+        outside the blocking calls is added to the calls being recorded
+        '''
+        def wrapper(seconds):
+            stack = cls._stack()
+            if not stack or cls._local.waiting:
+                return function(seconds)
+            start = time.time()
+            try:
+                return function(seconds)
+            finally:
+                slept = time.time() - start
+                for record in stack:
+                    record.slept += slept
+        return wrapper
+
+    @classmethod
+    def summary(cls):
+        '''
+        return {method name: {"calls": n, "wall": s, "blocked": s, "slept": s,
+                              "bytes_received": n, "round_trips": n}}
+        '''
+        result = {}
+        with cls._lock:
+            records = list(cls.records)
+        for record in records:
+            totals = result.setdefault(record.name, {"calls": 0, "wall": 0.0, "blocked": 0.0, "slept": 0.0,
+                                                     "bytes_received": 0, "round_trips": 0})
+            totals["calls"] += 1
+            for key in ["wall", "blocked", "slept", "bytes_received", "round_trips"]:
+                totals[key] += getattr(record, key)
+        return result
+
+    @classmethod
+    def export(cls, prefix):
+        '''
+        write the records to prefix.jsonl and prefix.trace.json
+        '''
+        cls.export_jsonl(prefix + ".jsonl")
+        cls.export_chrome_trace(prefix + ".trace.json")
+
+    @classmethod
+    def export_jsonl(cls, path):
+        '''
+        write the records to the file, one JSON object per line, in the order the calls finished
+        '''
+        with cls._lock:
+            records = list(cls.records)
+        with open(path, "w") as output:
+            for record in records:
+                output.write(json.dumps(record.as_dict(), sort_keys=True) + "\n")
+
+    @classmethod
+    def export_chrome_trace(cls, path):
+        '''
+        write the records to the file as Chrome trace events
+        '''
+        with cls._lock:
+            records = sorted(cls.records, key=lambda record: (record.start, record.depth))
+        events = []
+        pid = os.getpid()
+        for record in records:
+            events.append({"name": record.name,
+                           "cat": "rhui3_tests_lib",
+                           "ph": "X",
+                           "ts": int(record.start * 1000000),
+                           "dur": int(record.wall * 1000000),
+                           "pid": pid,
+                           "tid": record.thread,
+                           "args": {"blocked": record.blocked,
+                                    "slept": record.slept,
+                                    "bytes_received": record.bytes_received,
+                                    "round_trips": record.round_trips,
+                                    "error": record.error}})
+        with open(path, "w") as output:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, output)
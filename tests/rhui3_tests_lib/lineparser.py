@@ -3,16 +3,23 @@ generic list parser
 """
 
 class Parser(object):
+    """
+    a parser of items spanning several consecutive lines, one line per mapping entry
 
-    def __init__(self, mapping=[]):
-        self.mapping = mapping
-        self.pairs = []
-        self.index = 0
-        self.linenr = 0
+    The mapping is compiled into a table of (name, match function) entries once;
+    parsing keeps its state in local variables only, so a single parser can be shared
+    by any number of callers and threads, and the items are yielded as soon as their
+    last line has been read, so the lines can come from an arbitrarily large listing.
+    """
 
-    def parse(self, lines=[]):
+    def __init__(self, mapping=None):
+        self.mapping = list(mapping or [])
+        # the dispatch table: the entry for the n-th line of an item
+        self.table = tuple((name, pattern.match) for name, pattern in self.mapping)
+
+    def parse(self, lines=()):
         """
-        parse the list of lines yielding mapping pairs a time
+        parse the list (or any iterable) of lines yielding mapping pairs a time
         lines as shown in list of items on some rhui screen
         mapping is a list of tuples:
             [
@@ -35,30 +42,37 @@ class Parser(object):
             ...
         where line_nr is the line number on which the item starts
         """
-        self.linenr = 0
-        self.index = 0
-        self.pairs = []
-        for line in lines:
-            self.linenr += 1
-            name, pattern = self.mapping[self.index]
-            match = pattern.match(line)
-
-            if match is None:
-                if self.index == 0:
+        table = self.table
+        if not table:
+            return
+        size = len(table)
+        first_name, first_match = table[0]
+        index = 0
+        pairs = []
+        for linenr, line in enumerate(lines):
+            if index == 0:
+                match = first_match(line)
+                if match is None:
                     # lines not matching while "outside" an item are OK
                     continue
-                else:
+                start = linenr
+                pairs = [(first_name, match.groups())]
+            else:
+                name, match_line = table[index]
+                match = match_line(line)
+                if match is None:
                     # but lines that don't match while processing an item are input error
-                    raise ValueError("%s doesn't match %s at line #%s" (pattern, line, self.linenr))
-
-            # add matching name--value pair and shift mapping index
-            self.pairs.append((name, match.groups()))
-            self.index = (self.index + 1) % len(self.mapping)
-
-            if self.index == 0:
+                    raise ValueError("%s doesn't match %s at line #%s" % (self.mapping[index][1].pattern,
+                                                                           line, linenr + 1))
+                pairs.append((name, match.groups()))
+            index += 1
+            if index == size:
                 # new item starts next iteration
-                yield self.linenr - len(self.mapping), self.pairs
-                pairs = []
+                index = 0
+                yield start, pairs
 
-        def copy(self, prefix=[], suffix=[]):
-            return type(self)(mapping=prefix + self.mapping + suffix)
+    def copy(self, prefix=None, suffix=None):
+        """
+        return a parser with the mapping extended by the prefix and the suffix
+        """
+        return type(self)(mapping=list(prefix or []) + self.mapping + list(suffix or []))
@@ -0,0 +1,58 @@
+""" Cache of compiled regular expressions built from names """
+
+import re
+
+class PatternCache(object):
+    '''
+    A bounded LRU cache of compiled regular expressions.
+
+    Patterns are built from a template with a single %s placeholder and a value,
+    typically a repository name, and are keyed by both, so polling loops don't
+    rebuild and recompile the same expressions over and over again.
+    '''
+    def __init__(self, size=256):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._tick = 0
+        # key -> [compiled pattern, last use]
+        self._entries = {}
+
+    def get(self, template, value="", flags=re.DOTALL):
+        '''
+        return the compiled template with the value filled in literally
+        (all the regex metacharacters in the value are escaped)
+        '''
+        key = (template, value, flags)
+        self._tick += 1
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            entry[1] = self._tick
+            return entry[0]
+        self.misses += 1
+        pattern = re.compile(template % re.escape(value), flags)
+        if len(self._entries) >= self.size:
+            oldest = min(self._entries, key=lambda other: self._entries[other][1])
+            del self._entries[oldest]
+        self._entries[key] = [pattern, self._tick]
+        return pattern
+
+    def stats(self):
+        '''
+        return a dictionary with the cache statistics
+        '''
+        return {"size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses}
+
+    def clear(self):
+        '''
+        drop all the cached patterns and reset the counters
+        '''
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+# the cache shared by the rhui3_tests_lib modules
+PATTERNS = PatternCache()
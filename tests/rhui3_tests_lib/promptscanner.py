@@ -0,0 +1,148 @@
+""" Incremental prompt detection """
+
+import codecs
+import logging
+import socket
+import sys
+import time
+
+from stitches.expect import ExpectFailed
+
+class PromptScanner(object):
+    '''
+    Read from the shell channel of a connection until one of the given prompts shows up.
+
+    Unlike Expect.match() with a "(.*)prompt" pattern, which is re-applied to the whole
+    received text every time new data arrives, only the newly received text (plus a few
+    characters of the previous one, in case a prompt is split across reads) is searched
+    for the prompts, which are plain strings. The text received before the prompt is
+    then returned in one piece.
+    '''
+    def __init__(self, prompts):
+        if not prompts:
+            raise ValueError("No prompts to scan for")
+        self.prompts = list(prompts)
+        self.overlap = max(len(prompt) for prompt in self.prompts) - 1
+
+    def _find(self, text, start=0):
+        '''
+        return (position, prompt) of the prompt appearing first in the text (from start), or (-1, None)
+        '''
+        found = (-1, None)
+        for prompt in self.prompts:
+            position = text.find(prompt, start)
+            if position != -1 and (found[0] == -1 or position < found[0]):
+                found = (position, prompt)
+        return found
+
+    def _receive(self, connection, timeout):
+        '''
+        (internally used) generate the texts received from the shell channel
+        raises ExpectFailed with the text received so far (if kept) if nothing arrives in time
+        '''
+        channel = connection.channel
+        decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        deadline = time.time() + timeout
+        channel_timeout = channel.gettimeout()
+        try:
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise ExpectFailed("No prompt in %s seconds" % timeout)
+                channel.settimeout(min(remaining, 1.0))
+                try:
+                    data = channel.recv(131072)
+                except socket.timeout:
+                    continue
+                if not data:
+                    raise ExpectFailed("Channel closed")
+                deadline = time.time() + timeout
+                text = decoder.decode(data)
+                logging.getLogger('stitches.expect').debug("RCV: " + text)
+                if getattr(connection, "output_shell", False):
+                    sys.stdout.write(text)
+                yield text
+        finally:
+            channel.settimeout(channel_timeout)
+
+    def read(self, connection, timeout=60):
+        '''
+        return (text received before the prompt, prompt)
+        the prompt is eaten, and so is anything received after it in the same read
+        timeout is the number of seconds to wait for more text; note that Expect.match()
+        effectively waits up to 11 seconds per unit of its timeout when nothing arrives
+        raises ExpectFailed if no prompt shows up in time
+        '''
+        chunks = []
+        length = 0
+        tail = ""
+        try:
+            for text in self._receive(connection, timeout):
+                window = tail + text
+                position, prompt = self._find(window)
+                if position != -1:
+                    # position of the prompt in all the text received so far
+                    end = length - len(tail) + position
+                    chunks.append(text)
+                    return "".join(chunks)[:end], prompt
+                chunks.append(text)
+                length += len(text)
+                tail = window[-self.overlap:] if self.overlap else ""
+        except ExpectFailed as error:
+            raise ExpectFailed("%s: %s" % (error, "".join(chunks)))
+
+    def lines(self, connection, timeout=60):
+        '''
+        generate the lines received before the prompt as they arrive, without the line endings;
+        the prompts must not span lines, and the prompt is eaten once the generator is exhausted
+        only the last, incomplete line is kept, so the memory use doesn't grow with the text
+        raises ExpectFailed if no prompt shows up in time
+        '''
+        partial = ""
+        for text in self._receive(connection, timeout):
+            lines = (partial + text).split("\n")
+            partial = lines.pop()
+            lines.append(partial)
+            for number, line in enumerate(lines):
+                position, _ = self._find(line)
+                if position != -1:
+                    if line[:position]:
+                        yield line[:position].rstrip("\r")
+                    return
+                if number < len(lines) - 1:
+                    yield line.rstrip("\r")
+
+    def read_nth(self, connection, count, timeout=60):
+        '''
+        return the text received between the (count - 1)-th and the count-th prompt,
+        e.g. the last of several redraws answering several entered lines at once
+        the prompts are found by plain text search and only the text after the latest
+        prompt is kept, so the time and memory use are linear in the received text
+        the count-th prompt is eaten, and so is anything received after it in the same read
+        raises ExpectFailed if the prompts don't show up in time
+        '''
+        block = ""
+        start = 0
+        seen = 0
+        try:
+            for text in self._receive(connection, timeout):
+                block += text
+                while True:
+                    position, prompt = self._find(block, start)
+                    if position == -1:
+                        start = max(0, len(block) - self.overlap)
+                        break
+                    seen += 1
+                    if seen == count:
+                        return block[:position]
+                    block = block[position + len(prompt):]
+                    start = 0
+        except ExpectFailed as error:
+            raise ExpectFailed("%s (%s of %s prompts): %s" % (error, seen, count, block))
+
+    @staticmethod
+    def read_until(connection, prompts, timeout=60):
+        '''
+        return the text received before any of the prompts, eat the prompt
+        '''
+        return PromptScanner(prompts).read(connection, timeout)[0]
@@ -0,0 +1,120 @@
+""" Immutable records of the things listed on rhui-manager screens """
+
+import re
+
+# kinds of repositories as shown after the repository names
+REPO_KINDS = ["Yum", "Docker", "OSTree"]
+REPO_LABEL_PATTERN = re.compile(r'^(.*?)(?: \(([^()]*)\))? \((%s)\)$' % "|".join(REPO_KINDS))
+
+class Record(object):
+    """
+    A base of small immutable value objects
+
+    The fields are the __slots__ of the subclasses; records of the same class with
+    the same field values are equal and hash the same, so they can be put in sets
+    and used as dictionary keys, and they take no more memory than the values.
+    """
+    __slots__ = ()
+
+    def __init__(self, *values):
+        if len(values) != len(self.__slots__):
+            raise TypeError("%s takes %s values" % (type(self).__name__, len(self.__slots__)))
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("%s is immutable" % type(self).__name__)
+
+    def __delattr__(self, name):
+        raise AttributeError("%s is immutable" % type(self).__name__)
+
+    def values(self):
+        """
+        return the tuple of the field values
+        """
+        return tuple([getattr(self, name) for name in self.__slots__])
+
+    def replace(self, **changes):
+        """
+        return a copy of the record with the given fields changed
+        """
+        values = [changes.pop(name, getattr(self, name)) for name in self.__slots__]
+        if changes:
+            raise TypeError("No such fields: " + ", ".join(changes))
+        return type(self)(*values)
+
+    def __repr__(self):
+        return type(self).__name__ + "(" + \
+               ", ".join(["%s=%r" % (name, getattr(self, name)) for name in self.__slots__]) + \
+               ")"
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.values() == other.values()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __lt__(self, other):
+        """for sorted lists of records"""
+        return (type(self).__name__, self.values()) < (type(other).__name__, other.values())
+
+    def __hash__(self):
+        return hash((type(self).__name__,) + self.values())
+
+    def __reduce__(self):
+        """for copy and pickle, which can't set the attributes one by one"""
+        return type(self), self.values()
+
+class Repo(Record):
+    """A repository as listed on the repository screen"""
+    __slots__ = ("name", "version", "kind", "repo_id")
+
+    def __init__(self, name, version=None, kind=None, repo_id=None):
+        Record.__init__(self, name, version, kind, repo_id)
+
+    @property
+    def label(self):
+        """
+        the name with the version and the kind, as shown by rhui-manager
+        """
+        label = self.name
+        if self.version:
+            label += " (%s)" % self.version
+        if self.kind:
+            label += " (%s)" % self.kind
+        return label
+
+    @classmethod
+    def from_label(cls, label, repo_id=None):
+        """
+        return the repository listed as the given label: "name (version) (kind)"
+        for Red Hat repositories, just the name for custom repositories
+        """
+        match = REPO_LABEL_PATTERN.match(label)
+        if match is None:
+            return cls(label, repo_id=repo_id)
+        return cls(match.group(1), match.group(2), match.group(3), repo_id)
+
+class SyncStatus(Record):
+    """The synchronization status of a repository"""
+    __slots__ = ("repo", "last_sync", "next_sync", "result")
+
+    def __init__(self, repo, last_sync="Never", next_sync="", result="Never"):
+        Record.__init__(self, repo, last_sync, next_sync, result)
+
+class Entitlement(Record):
+    """An entitlement of a content certificate"""
+    __slots__ = ("name", "path")
+
+    def __init__(self, name, path=None):
+        Record.__init__(self, name, path)
+
+    @classmethod
+    def from_text(cls, text):
+        """
+        return the entitlement listed as the given text: the name and the path on the next line
+        """
+        lines = text.strip().splitlines()
+        if len(lines) < 2:
+            return cls(text.strip())
+        return cls(lines[0].strip(), lines[-1].strip())
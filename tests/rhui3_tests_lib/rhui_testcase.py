@@ -4,13 +4,13 @@
 import os
 import nose
 import logging
-import time
 
 from stitches import structure
 from stitches.expect import Expect, ExpectFailed
 from rhui3_tests_lib.rhuimanager import RHUIManager
-from rhui3_tests_lib.rhuimanager_sync import RHUIManagerSync
+from rhui3_tests_lib.rhuimanager_sync import RHUIManagerSync, SyncWatcher, SYNC_TIMEOUT
 from rhui3_tests_lib.util import Util
+from rhui3_tests_lib.waiter import Waiter
 
 class RHUITestcase(object):
     """ RHUI testcase """
@@ -75,12 +75,11 @@ class RHUITestcase(object):
             # Trying to check the status
             Expect.enter(self.rs.Instances["RHUA"][0], "b")
             RHUIManager.quit(self.rs.Instances["RHUA"][0])
+        watcher = SyncWatcher(self.rs.Instances["RHUA"][0], repolist,
+                              Waiter(timeout=SYNC_TIMEOUT, name="sync"))
+        watcher.wait(lambda status: status.next_sync in ["In Progress", "Never"])
         for repo in repolist:
-            reposync = ["In Progress", "", ""]
-            while reposync[0] in ["In Progress", "Never"]:
-                time.sleep(10)
-                reposync = RHUIManagerSync.get_repo_status(self.rs.Instances["RHUA"][0], repo)
-            nose.tools.assert_equal(reposync[2], "Success")
+            nose.tools.assert_equal(watcher.statuses[repo].result, "Success")
 
 
 class RHUI_has_RH_rpm(object):
@@ -1,18 +1,290 @@
 import re
+import heapq
+import inspect
 import logging
+import weakref
 
 from stitches.expect import Expect, ExpectFailed
+from rhui3_tests_lib.channelfilter import FilteredChannel
+from rhui3_tests_lib.patterncache import PATTERNS
+from rhui3_tests_lib.promptscanner import PromptScanner
+from rhui3_tests_lib.screensnapshot import ScreenSnapshot
+from rhui3_tests_lib.terminalprofile import QUIET_PROFILE
 from rhui3_tests_lib.util import Util
 
 SELECT_PATTERN = re.compile('^  (x|-)  (\d+) :')
 PROCEED_PATTERN = re.compile('.*Proceed\? \(y/n\).*', re.DOTALL)
-CONFIRM_PATTERN_STRING = "Enter value \([\d]+-[\d]+\) to toggle selection, 'c' to confirm selections, or '\?' for more commands: "
+# plain texts the screens end with, for the PromptScanner
+SELECTION_PROMPT = "for more commands:"
+PROCEED_PROMPT = "Proceed? (y/n)"
+SCREEN_PROMPT_SUFFIX = ") =>"
+# a value to select ending with this matches the labels starting with the rest of the value
+LABEL_WILDCARD = ".*"
 
 class NotSelectLine(ValueError):
     """
     to be raised when the line isn't actually a selection line
     """
 
+# keys entered on the home screen to open the other screens
+SCREEN_KEYS = {"repo": "r",
+               "cds": "c",
+               "loadbalancers": "l",
+               "sync": "s",
+               "identity": "i",
+               "users": "u",
+               "client": "e",
+               "entitlements": "n",
+               "subscriptions": "sm"}
+
+# navigation graph of rhui-manager: screen -> [(key, target screen, cost), ...]
+# None stands for the shell (rhui-manager not running); starting rhui-manager
+# is much more expensive than moving between its screens
+NAVIGATION = {None: [("rhui-manager", "home", 10)],
+              "home": [("q", None, 1)]}
+for _name, _key in SCREEN_KEYS.items():
+    NAVIGATION["home"].append((_key, _name, 1))
+    NAVIGATION[_name] = [("home", "home", 1), ("q", None, 1)]
+
+def screen_prompt(screen_name):
+    '''
+    return the prompt of the given screen
+    '''
+    return "rhui (" + screen_name + SCREEN_PROMPT_SUFFIX
+
+def label_pattern(template, value, flags=re.DOTALL):
+    '''
+    return the compiled template (with a single %s) for the label given as the value;
+    the value is taken literally, except that a value ending with LABEL_WILDCARD stands
+    for the labels starting with the rest of it
+    '''
+    if value.endswith(LABEL_WILDCARD):
+        return PATTERNS.get(template.replace("%s", "%s[^\n]*"), value[:-len(LABEL_WILDCARD)], flags)
+    return PATTERNS.get(template, value, flags)
+
+def navigation_path(source, target):
+    '''
+    return the cheapest list of (key, screen) steps leading from source to target
+    '''
+    costs = {source: 0}
+    paths = {source: []}
+    # the counter keeps the heap from comparing screen names (and None)
+    counter = 0
+    queue = [(0, counter, source)]
+    while queue:
+        cost, _, screen = heapq.heappop(queue)
+        if screen == target:
+            return paths[screen]
+        if cost > costs[screen]:
+            continue
+        for key, other, step_cost in NAVIGATION[screen]:
+            if other not in costs or cost + step_cost < costs[other]:
+                costs[other] = cost + step_cost
+                paths[other] = paths[screen] + [(key, other)]
+                counter += 1
+                heapq.heappush(queue, (costs[other], counter, other))
+    raise ValueError("No way from %s to %s" % (source, target))
+
+class RHUIManagerSession(object):
+    '''
+    The rhui-manager process running in the interactive shell of a connection.
+
+    The shell channel of the connection is wrapped in a FilteredChannel, so that
+    the screens are read without colors and other escape sequences, and rhui-manager
+    is launched with the terminal settings of the session profile (a TerminalProfile,
+    or None to launch it in the terminal as it is).
+
+    There is one session per connection. It knows whether rhui-manager is running
+    and which screen it shows, so the screen classes can move between screens
+    through the home menu instead of launching rhui-manager for every operation.
+    By default, rhui-manager is still quit after each operation; set keep_alive
+    to leave it running between operations. An operation lasts from open() to the
+    release of the session; if it fails halfway (see screen_operation), rhui-manager
+    may be left in any dialog, so it's killed and launched anew by the next operation.
+    '''
+    _sessions = weakref.WeakKeyDictionary()
+
+    def __init__(self, connection):
+        self.connection = connection
+        # None if rhui-manager isn't running, otherwise "home" or a screen name
+        self.current = None
+        # True from the opening of a screen until the operation releases the session
+        self.busy = False
+        self.keep_alive = False
+        self.profile = QUIET_PROFILE
+
+    @classmethod
+    def get(cls, connection):
+        '''
+        return the session of the given connection, create it if necessary
+        '''
+        session = cls._sessions.get(connection)
+        if session is None:
+            session = cls(connection)
+            cls._sessions[connection] = session
+        if FilteredChannel.install(connection):
+            # a new shell channel (the connection has been reconnected), rhui-manager isn't running
+            session.current = None
+        return session
+
+    @property
+    def running(self):
+        '''
+        True if rhui-manager is believed to be running
+        '''
+        return self.current is not None
+
+    def launch_command(self):
+        '''
+        return the shell command line launching rhui-manager
+        '''
+        if self.profile is None:
+            return "rhui-manager"
+        return self.profile.launch_command("rhui-manager")
+
+    def bytes_received(self):
+        '''
+        return the number of bytes received over the shell channel so far
+        '''
+        return getattr(self.connection.channel, "received", 0)
+
+    def measure(self, operation, *args, **kwargs):
+        '''
+        run the operation, return (its result, number of bytes received meanwhile)
+        '''
+        before = self.bytes_received()
+        result = operation(*args, **kwargs)
+        return result, self.bytes_received() - before
+
+    def profile_savings(self, operation, *args, **kwargs):
+        '''
+        run the operation (typically a listing) in rhui-manager launched in the plain
+        terminal and then with the session profile, return a dictionary with the number
+        of bytes received during the operation in each case and the number of bytes saved
+        by the profile; launching rhui-manager itself isn't counted
+        '''
+        profile = self.profile
+        received = []
+        try:
+            for self.profile in [None, profile]:
+                self.close()
+                self.open("home")
+                received.append(self.measure(operation, *args, **kwargs)[1])
+            self.close()
+        finally:
+            self.profile = profile
+        logging.debug("%s: %s bytes in the plain terminal, %s bytes with %s" % \
+                      (getattr(operation, "__name__", operation), received[0], received[1], profile))
+        return {"plain": received[0], "profile": received[1], "saved": received[0] - received[1]}
+
+    def open(self, screen_name):
+        '''
+        move to the specified screen, (re)launch rhui-manager if necessary
+        '''
+        if screen_name not in NAVIGATION or screen_name is None:
+            raise ValueError("Unsupported screen name: " + str(screen_name))
+        self.busy = True
+        path = navigation_path(self.current, screen_name)
+        while path:
+            key, target = path.pop(0)
+            if self.current is None:
+                key = self.launch_command()
+            Expect.enter(self.connection, key)
+            if self.current is None:
+                Expect.expect(self.connection, re.escape(screen_prompt(target)))
+            else:
+                state = Expect.expect_list(self.connection,
+                                           [(re.compile(".*" + re.escape(screen_prompt(target)) + ".*", re.DOTALL), 1),
+                                            (re.compile(".*" + self.connection.username + "@.*", re.DOTALL), 2)])
+                if state == 2:
+                    # the process has exited behind our back, start over from the shell
+                    self.current = None
+                    path = navigation_path(None, screen_name)
+                    continue
+            self.current = target
+
+    def release(self):
+        '''
+        finish an operation whose closing prompt has been read;
+        quit rhui-manager unless the session is kept alive
+        '''
+        self.busy = False
+        if not self.keep_alive:
+            self.close()
+
+    def close(self):
+        '''
+        quit rhui-manager if it is running
+        '''
+        self.busy = False
+        if self.running:
+            Expect.enter(self.connection, "q")
+            self.current = None
+
+    def invalidate(self):
+        '''
+        note that rhui-manager is gone (killed, logged out, ...)
+        '''
+        self.busy = False
+        self.current = None
+
+    def recover(self):
+        '''
+        kill rhui-manager left in an unknown dialog by a failed operation and wait for
+        the shell, so that the next operation launches it anew; nothing is raised,
+        as this is done while the error of the operation is being raised
+        '''
+        self.invalidate()
+        try:
+            self.connection.recv_exit_status("killall -s SIGINT rhui-manager")
+            # a fresh shell prompt, whether rhui-manager was running or not
+            Expect.enter(self.connection, "")
+            Expect.expect(self.connection, self.connection.username + "@")
+        except Exception as error:
+            logging.debug("Recovering the rhui-manager session: %s" % error)
+
+def screen_operation(function):
+    '''
+    decorate a screen operation so that the session is recovered if the operation
+    fails before it has released the session; generator functions are supported
+    '''
+    def recover(connection):
+        '''recover the session of the connection if an operation is in progress'''
+        session = RHUIManagerSession.get(connection)
+        if session.busy:
+            session.recover()
+
+    # try/finally rather than except and raise, so that the error of the operation
+    # is raised as it is even if an error is handled while recovering (Python 2)
+    if inspect.isgeneratorfunction(function):
+        def wrapper(connection, *args, **kwargs):
+            finished = False
+            iterator = function(connection, *args, **kwargs)
+            try:
+                for item in iterator:
+                    yield item
+                finished = True
+            finally:
+                try:
+                    # if the caller has stopped early, the operation may still finish cleanly
+                    iterator.close()
+                finally:
+                    if not finished:
+                        recover(connection)
+    else:
+        def wrapper(connection, *args, **kwargs):
+            finished = False
+            try:
+                result = function(connection, *args, **kwargs)
+                finished = True
+                return result
+            finally:
+                if not finished:
+                    recover(connection)
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    return wrapper
+
 class RHUIManager(object):
     '''
     Basic functions to manage rhui-manager.
@@ -29,52 +301,97 @@ class RHUIManager(object):
         return match.groups()[0] == 'x', int(match.groups()[1])
 
     @staticmethod
-    def list_lines(connection, prompt='', enter_l=True):
+    def list_lines(connection, prompt=SCREEN_PROMPT_SUFFIX, enter_l=True):
         '''
         list items on screen returning a list of lines seen
+        prompt is the plain text the listing ends with (any screen prompt by default)
         eats prompt!!!
         '''
         if enter_l:
             Expect.enter(connection, "l")
-        match = Expect.match(connection, re.compile("(.*)" + prompt, re.DOTALL))
-        return match[0].split('\r\n')
+        return PromptScanner.read_until(connection, [prompt]).split('\r\n')
 
     @staticmethod
-    def select(connection, value_list):
+    def select(connection, value_list, batch=True):
         '''
         Select list of items (multiple choice)
+
+        The values are labels (see label_pattern). In the batch mode, the listing is parsed once, all the toggles are entered at once,
+        and the selection is verified in a single redraw. Otherwise, each value is matched,
+        toggled and verified one by one.
         '''
+        if batch:
+            RHUIManager._select_batch(connection, value_list)
+            return
         for value in value_list:
-            match = Expect.match(connection, re.compile(".*-\s+([0-9]+)\s*:[^\n]*\s+" +
-                                                        Util.esc_parentheses(value) +
-                                                        "\s*\n.*for more commands:.*", re.DOTALL))
+            match = Expect.match(connection, label_pattern(".*-\\s+([0-9]+)\\s*:[^\n]*\\s+%s\\s*\n.*for more commands:.*",
+                                                           value))
             Expect.enter(connection, match[0])
-            match = Expect.match(connection, re.compile(".*x\s+([0-9]+)\s*:[^\n]*\s+" +
-                                                        Util.esc_parentheses(value) +
-                                                        "\s*\n.*for more commands:.*", re.DOTALL))
+            match = Expect.match(connection, label_pattern(".*x\\s+([0-9]+)\\s*:[^\n]*\\s+%s\\s*\n.*for more commands:.*",
+                                                           value))
             Expect.enter(connection, "l")
         Expect.enter(connection, "c")
 
+    @staticmethod
+    def _select_batch(connection, value_list):
+        '''
+        (internally used) select the values in one pass over the listing
+        '''
+        snapshot = ScreenSnapshot(RHUIManager.list_lines(connection,
+                                                         prompt=SELECTION_PROMPT,
+                                                         enter_l=False))
+        wanted = []
+        toggles = []
+        for value in value_list:
+            state = snapshot.lookup(value)
+            if state is None:
+                # values may match the end of the label (or its beginning, see label_pattern);
+                # like the one-by-one selection, take the last matching item
+                state = snapshot.search(label_pattern("(?:^|\\s)%s\\s*$", value, 0))
+            if state is None:
+                logging.debug("Not found on the screen: " + value)
+                raise ExpectFailed(value)
+            selected, index = state
+            wanted.append(index)
+            if not selected and index not in toggles:
+                toggles.append(index)
+        # every entered line is answered with a prompt, the last one follows the final listing
+        Expect.enter(connection, "\n".join([str(index) for index in toggles] + ["l"]))
+        final = PromptScanner([SELECTION_PROMPT]).read_nth(connection, len(toggles) + 1)
+        selected = ScreenSnapshot(final.split("\r\n")).selected()
+        missing = [index for index in wanted if index not in selected]
+        if missing:
+            logging.debug("Not selected: " + str(missing))
+            raise ExpectFailed()
+        Expect.enter(connection, "c")
+
     @staticmethod
     def select_items(connection, itemslist):
         '''
         Select list of items (multiple choice)
+
+        The items are either texts found in the item labels or parsed screen items
+        such as Instance objects.
         '''
-        lines = RHUIManager.list_lines(connection, prompt=CONFIRM_PATTERN_STRING, enter_l=False)
+        item_class = next((type(item) for item in itemslist if hasattr(item, "iter_parse")), None)
+        snapshot = ScreenSnapshot(RHUIManager.list_lines(connection, prompt=SELECTION_PROMPT, enter_l=False),
+                                  item_class)
+        indexes = []
         for item in itemslist:
-            for line in lines:
-                if item in line:
-                     index = list(filter(str.isdigit, str(lines[lines.index(line)-1])))[0]
-                     Expect.enter(connection, index)
-                     break
-        Expect.enter(connection, "c")
+            if hasattr(item, "iter_parse"):
+                state = snapshot.lookup(item)
+            else:
+                state = snapshot.find(item)
+            if state is not None:
+                indexes.append(str(state[1]))
+        Expect.enter(connection, "\n".join(indexes + ["c"]))
 
     @staticmethod
     def select_one(connection, item):
         '''
         Select one item (single choice)
         '''
-        match = Expect.match(connection, re.compile(".*([0-9]+)\s+-\s+" + item + "\s*\n.*to abort:.*", re.DOTALL))
+        match = Expect.match(connection, PATTERNS.get(".*[^0-9]([0-9]+)\\s+-\\s+%s\\s*\n.*to abort:.*", item))
         Expect.enter(connection, match[0])
 
     @staticmethod
@@ -96,7 +413,16 @@ class RHUIManager(object):
         Use @param timeout to specify the timeout
         '''
         Expect.expect(connection, prefix + ".*rhui \(.*\) =>", timeout)
-        Expect.enter(connection, "q")
+        RHUIManagerSession.get(connection).release()
+
+    @staticmethod
+    def release(connection):
+        '''
+        Finish a screen operation after its prompt has been eaten
+
+        Quits rhui-manager unless the session is kept alive.
+        '''
+        RHUIManagerSession.get(connection).release()
 
     @staticmethod
     def logout(connection, prefix=""):
@@ -107,6 +433,7 @@ class RHUIManager(object):
         '''
         Expect.expect(connection, prefix + ".*rhui \(.*\) =>")
         Expect.enter(connection, "logout")
+        RHUIManagerSession.get(connection).invalidate()
 
     @staticmethod
     def proceed_without_check(connection):
@@ -123,7 +450,7 @@ class RHUIManager(object):
 
         Use @param skip_list to skip meaningless 2nd-level headers
         '''
-        selected = Expect.match(connection, re.compile(".*" + caption + "\r\n(.*)\r\nProceed\? \(y/n\).*", re.DOTALL))[0].split("\r\n")
+        selected = Expect.match(connection, PATTERNS.get(".*%s\r\n(.*)\r\nProceed\\? \\(y/n\\).*", caption))[0].split("\r\n")
         selected_clean = []
         for val in selected:
             val = val.strip()
@@ -142,27 +469,18 @@ class RHUIManager(object):
         '''
         Open specified rhui-manager screen
         '''
-        if screen_name in ["repo", "cds", "loadbalancers", "sync", "identity", "users"]:
-            key = screen_name[:1]
-        elif screen_name == "client":
-            key = "e"
-        elif screen_name == "entitlements":
-            key = "n"
-        elif screen_name == "subscriptions":
-            key = "sm"
-        else:
-            raise ValueError("Unsupported screen name: " + screen_name)
-        Expect.enter(connection, "rhui-manager")
-        Expect.expect(connection, "rhui \(home\) =>")
-        Expect.enter(connection, key)
-        Expect.expect(connection, "rhui \(" + screen_name + "\) =>")
+        RHUIManagerSession.get(connection).open(screen_name)
 
     @staticmethod
     def initial_run(connection, username="admin", password="admin"):
         '''
         Do rhui-manager initial run
         '''
-        Expect.enter(connection, "rhui-manager")
+        session = RHUIManagerSession.get(connection)
+        if session.running:
+            # logged in already
+            return
+        Expect.enter(connection, session.launch_command())
         state = Expect.expect_list(connection, [(re.compile(".*RHUI Username:.*", re.DOTALL),1),
                                                 (re.compile(".*rhui \(home\) =>.*", re.DOTALL), 2)])
         if state == 1:
@@ -173,7 +491,7 @@ class RHUIManager(object):
                                                 (re.compile(".*rhui \(home\) =>.*", re.DOTALL), 2)])
             if password_state == 1:
                 initial_password = Util.get_initial_password(connection)
-                Expect.enter(connection, "rhui-manager")
+                Expect.enter(connection, session.launch_command())
                 Expect.expect(connection, ".*RHUI Username:")
                 Expect.enter(connection, username)
                 Expect.expect(connection, "RHUI Password:")
@@ -184,6 +502,7 @@ class RHUIManager(object):
         else:
             # initial step was already performed by someone
             pass
+        session.current = "home"
 
     @staticmethod
     def change_user_password(connection, password='admin'):
@@ -203,5 +522,6 @@ class RHUIManager(object):
         '''
         Remove all RH certificates from RHUI
         '''
+        RHUIManagerSession.get(connection).close()
         Expect.enter(connection, "find /etc/pki/rhui/redhat/ -name '*.pem' -delete")
         Expect.expect(connection, "root@")
@@ -1,7 +1,7 @@
 """ RHUIManager Client functions """
 
 from stitches.expect import Expect
-from rhui3_tests_lib.rhuimanager import RHUIManager
+from rhui3_tests_lib.rhuimanager import RHUIManager, screen_operation
 
 
 class RHUIManagerClient(object):
@@ -9,6 +9,7 @@ class RHUIManagerClient(object):
     Represents -= Client Entitlement Management =- RHUI screen
     '''
     @staticmethod
+    @screen_operation
     def generate_ent_cert(connection, repolist, certname, dirname, validity_days="", cert_pw=None):
         '''
         generate an entitlement certificate
@@ -26,6 +27,7 @@ class RHUIManagerClient(object):
         RHUIManager.quit(connection)
 
     @staticmethod
+    @screen_operation
     def create_conf_rpm(connection, dirname, certpath, certkey, rpmname, rpmversion="", unprotected_repos=None):
         '''
         create a client configuration RPM from an entitlement certificate
@@ -47,6 +49,7 @@ class RHUIManagerClient(object):
         RHUIManager.quit(connection)
 
     @staticmethod
+    @screen_operation
     def create_docker_conf_rpm(connection, dirname, rpmname, rpmversion="", dockerport=""):
         '''
         create a docker client configuration RPM
@@ -64,6 +67,7 @@ class RHUIManagerClient(object):
         RHUIManager.quit(connection)
 
     @staticmethod
+    @screen_operation
     def create_atomic_conf_pkg(connection, dirname, tarname, certpath, certkey, dockerport=""):
         '''
         create an atomic client configuration package (RHEL 7+ only)
@@ -4,7 +4,9 @@ import re
 import nose
 
 from stitches.expect import Expect, ExpectFailed, CTRL_C
-from rhui3_tests_lib.rhuimanager import RHUIManager, PROCEED_PATTERN
+from rhui3_tests_lib.promptscanner import PromptScanner
+from rhui3_tests_lib.records import Entitlement
+from rhui3_tests_lib.rhuimanager import RHUIManager, PROCEED_PATTERN, screen_prompt, screen_operation
 
 class MissingCertificate(ExpectFailed):
     """
@@ -29,19 +31,20 @@ class RHUIManagerEntitlements(object):
     '''
     Represents -= Entitlements Manager =- RHUI screen
     '''
-    prompt = 'rhui \(entitlements\) => '
 
     @staticmethod
+    @screen_operation
     def list(connection):
         '''
         return the list of entitlements
         '''
         RHUIManager.screen(connection, "entitlements")
-        lines = RHUIManager.list_lines(connection, prompt=RHUIManagerEntitlements.prompt)
-        Expect.enter(connection, 'q')
+        lines = RHUIManager.list_lines(connection, prompt=screen_prompt("entitlements"))
+        RHUIManager.release(connection)
         return lines
 
     @staticmethod
+    @screen_operation
     def list_rh_entitlements(connection):
         '''
         list Red Hat entitlements
@@ -49,19 +52,34 @@ class RHUIManagerEntitlements(object):
 
         RHUIManager.screen(connection, "entitlements")
         Expect.enter(connection, "l")
-        match = Expect.match(connection, re.compile("(.*)" + RHUIManagerEntitlements.prompt, re.DOTALL))
+        screen = PromptScanner.read_until(connection, [screen_prompt("entitlements")])
 
-        matched_string = match[0].replace('l\r\n\r\nRed Hat Entitlements\r\n\r\n  \x1b[92mValid\x1b[0m\r\n    ', '', 1)
+        matched_string = RHUIManagerEntitlements._rh_listing(screen)
 
-        entitlements_list = []
+        RHUIManager.release(connection)
+        return RHUIManagerEntitlements._entitlements(matched_string)
+
+    @staticmethod
+    def _rh_listing(screen):
+        '''
+        (internally used) return the part of the screen after the header of the listing,
+        or the whole screen if there's no listing; the entered command may or may not
+        be echoed before the header
+        '''
+        return screen.split('Red Hat Entitlements\r\n\r\n  Valid\r\n    ', 1)[-1]
+
+    @staticmethod
+    def _entitlements(listing):
+        '''
+        (internally used) return the list of the Entitlement records in the listing:
+        the name of each entitlement and the path on the next line
+        '''
         pattern = re.compile('(.*?\r\n.*?pem)', re.DOTALL)
-        for entitlement in pattern.findall(matched_string):
-            entitlements_list.append(entitlement.strip())
-        Expect.enter(connection, 'q')
-        return entitlements_list
+        return [Entitlement.from_text(entitlement) for entitlement in pattern.findall(listing)]
 
 
     @staticmethod
+    @screen_operation
     def list_custom_entitlements(connection):
         '''
         list custom entitlements
@@ -69,17 +87,21 @@ class RHUIManagerEntitlements(object):
 
         RHUIManager.screen(connection, "entitlements")
         Expect.enter(connection, "c")
-        match = Expect.match(connection, re.compile("c\r\n\r\nCustom Repository Entitlements\r\n\r\n(.*)" + RHUIManagerEntitlements.prompt, re.DOTALL))[0]
+        screen = PromptScanner.read_until(connection, [screen_prompt("entitlements")])
+        if "Custom Repository Entitlements" not in screen:
+            raise ExpectFailed(screen)
+        match = screen.split("Custom Repository Entitlements", 1)[1]
 
         repo_list = []
 
         for line in match.splitlines():
             if "Name:" in line:
                 repo_list.append(line.replace("Name:", "").strip())
-        Expect.enter(connection, 'q')
+        RHUIManager.release(connection)
         return sorted(repo_list)
 
     @staticmethod
+    @screen_operation
     def upload_rh_certificate(connection, certificate_file = '/tmp/extra_rhui_files/rhcert.pem'):
         '''
         upload a new or updated Red Hat content certificate
@@ -97,18 +119,14 @@ class RHUIManagerEntitlements(object):
         Expect.enter(connection, certificate_file)
         Expect.expect(connection, "The RHUI will be updated with the following certificate:")
         Expect.enter(connection, "y")
-        match = Expect.match(connection, re.compile("(.*)" + RHUIManagerEntitlements.prompt, re.DOTALL))
-        matched_string = match[0].replace('l\r\n\r\nRed Hat Entitlements\r\n\r\n  \x1b[92mValid\x1b[0m\r\n    ', '', 1)
+        screen = PromptScanner.read_until(connection, [screen_prompt("entitlements")])
+        matched_string = RHUIManagerEntitlements._rh_listing(screen)
         if bad_cert_msg in matched_string:
-            Expect.enter(connection, 'q')
+            RHUIManager.release(connection)
             raise BadCertificate()
         if incompatible_cert_msg in matched_string:
-            Expect.enter(connection, 'q')
+            RHUIManager.release(connection)
             raise IncompatibleCertificate()
-        entitlements_list = []
-        pattern = re.compile('(.*?\r\n.*?pem)', re.DOTALL)
-        for entitlement in pattern.findall(matched_string):
-            entitlements_list.append(entitlement.strip())
-        Expect.enter(connection, 'q')
-        return entitlements_list
+        RHUIManager.release(connection)
+        return RHUIManagerEntitlements._entitlements(matched_string)
 
@@ -3,7 +3,7 @@
 import re
 
 from stitches.expect import Expect, ExpectFailed, CTRL_C
-from rhui3_tests_lib.rhuimanager import RHUIManager, PROCEED_PATTERN
+from rhui3_tests_lib.rhuimanager import RHUIManager, RHUIManagerSession, PROCEED_PATTERN, screen_prompt, screen_operation
 from rhui3_tests_lib.instance import Instance
 
 class InstanceAlreadyExistsError(ExpectFailed):
@@ -29,6 +29,7 @@ class RHUIManagerInstance(object):
     prompt_hap = 'rhui \(loadbalancers\) => '
 
     @staticmethod
+    @screen_operation
     def add_instance(connection, screen, hostname, user_name="ec2-user", ssh_key_path="/root/.ssh/id_rsa_rhua", update=False):
         '''
         Register (add) a new CDS or HAProxy instance
@@ -65,7 +66,7 @@ class RHUIManagerInstance(object):
         if state == 1:
             # don't know how to continue with invalid path: raise
             Expect.enter(connection, CTRL_C)
-            Expect.enter(connection, "q")
+            RHUIManagerSession.get(connection).close()
             raise InvalidSshKeyPath(ssh_key_path)
         # all OK, confirm
         Expect.enter(connection, "y")
@@ -74,6 +75,7 @@ class RHUIManagerInstance(object):
 
 
     @staticmethod
+    @screen_operation
     def delete(connection, screen, instances):
         '''
         unregister (delete) CDS instance from the RHUI
@@ -85,15 +87,16 @@ class RHUIManagerInstance(object):
         RHUIManager.quit(connection, "Unregistered", 180)
 
     @staticmethod
+    @screen_operation
     def list(connection, screen):
         '''
         return the list of currently managed CDSes
         '''
         RHUIManager.screen(connection, screen)
         # eating prompt!!
-        lines = RHUIManager.list_lines(connection, "rhui \(" + screen + "\) => ")
+        lines = RHUIManager.list_lines(connection, screen_prompt(screen))
         ret = Instance.parse(lines)
-        Expect.enter(connection, 'q')
+        RHUIManager.release(connection)
         return [cds for _, cds in ret]
 
 
@@ -1,11 +1,24 @@
 """ RHUIManager Repo functions """
 
+import logging
+import posixpath
+import random
 import re
-from os.path import basename
+import stat
 import time
+import weakref
+from os.path import basename
 
 from stitches.expect import Expect, ExpectFailed
-from rhui3_tests_lib.rhuimanager import RHUIManager
+from rhui3_tests_lib.promptscanner import PromptScanner
+from rhui3_tests_lib.records import Repo
+from rhui3_tests_lib.rhuimanager import RHUIManager, RHUIManagerSession, label_pattern, screen_prompt, screen_operation
+from rhui3_tests_lib.waiter import Waiter
+
+# lines of a package listing that aren't packages
+PACKAGE_LISTING_NOISE = ["", "Packages:",
+                         "No packages found that match the given filter.",
+                         "No packages in the repository."]
 
 
 class RHUIManagerRepo(object):
@@ -13,9 +26,11 @@ class RHUIManagerRepo(object):
     Represents -= Repository Management =- RHUI screen
     '''
     @staticmethod
+    @screen_operation
     def add_custom_repo(connection, reponame, displayname="", path="", checksum_alg="1", entitlement="y", entitlement_path="", redhat_gpg="y", custom_gpg=None):
         '''
         create a new custom repository
+        return True if it has been created, False if the ID is already in use
         '''
         RHUIManager.screen(connection, "repo")
         Expect.enter(connection, "c")
@@ -80,11 +95,47 @@ class RHUIManagerRepo(object):
 
             RHUIManager.proceed_with_check(connection, "The following repository will be created:", checklist)
             RHUIManager.quit(connection, "Successfully created repository *")
+            RepoInventory.get(connection).add(Repo(displayname or reponame, repo_id=reponame))
+            return True
         else:
             Expect.enter(connection, '\x03')
             RHUIManager.quit(connection)
+            return False
+
+    @staticmethod
+    def add_custom_repos(connection, specs):
+        '''
+        create new custom repositories in one rhui-manager session
+        specs is a list of dictionaries with the arguments of add_custom_repo() but the connection:
+        reponame and optionally displayname, path, checksum_alg, entitlement, entitlement_path,
+        redhat_gpg and custom_gpg; the summary of every repository is checked before it's created
+        return {"created": {repo ID: seconds}, "skipped": [IDs already in use],
+                "seconds": total seconds, "throughput": repositories created per second}
+        '''
+        session = RHUIManagerSession.get(connection)
+        keep_alive = session.keep_alive
+        session.keep_alive = True
+        created = {}
+        skipped = []
+        start = time.time()
+        try:
+            for spec in specs:
+                repo_start = time.time()
+                if RHUIManagerRepo.add_custom_repo(connection, **spec):
+                    created[spec["reponame"]] = time.time() - repo_start
+                else:
+                    skipped.append(spec["reponame"])
+        finally:
+            session.keep_alive = keep_alive
+        RHUIManager.release(connection)
+        seconds = time.time() - start
+        throughput = len(created) / seconds if seconds > 0 else 0.0
+        logging.debug("%s custom repos created in %.1f s (%.2f/s), %s skipped" %
+                      (len(created), seconds, throughput, len(skipped)))
+        return {"created": created, "skipped": skipped, "seconds": seconds, "throughput": throughput}
 
     @staticmethod
+    @screen_operation
     def add_rh_repo_all(connection):
         '''
         add a new Red Hat content repository (All in Certificate)
@@ -95,8 +146,10 @@ class RHUIManagerRepo(object):
         Expect.enter(connection, "1")
         RHUIManager.proceed_without_check(connection)
         RHUIManager.quit(connection, "", 180)
+        RepoInventory.get(connection).invalidate()
 
     @staticmethod
+    @screen_operation
     def add_rh_repo_by_product(connection, productlist):
         '''
         add a new Red Hat content repository (By Product)
@@ -108,8 +161,10 @@ class RHUIManagerRepo(object):
         RHUIManager.select(connection, productlist)
         RHUIManager.proceed_with_check(connection, "The following products will be deployed:", productlist)
         RHUIManager.quit(connection)
+        RepoInventory.get(connection).invalidate()
 
     @staticmethod
+    @screen_operation
     def add_rh_repo_by_repo(connection, repolist):
         '''
         add a new Red Hat content repository (By Repository)
@@ -124,8 +179,12 @@ class RHUIManagerRepo(object):
             repolist_mod.append(re.sub(" \([a-zA-Z0-9_-]*\) \([a-zA-Z]*\)", "", repo))
         RHUIManager.proceed_with_check(connection, "The following product repositories will be deployed:", repolist_mod)
         RHUIManager.quit(connection)
+        inventory = RepoInventory.get(connection)
+        for repo in repolist:
+            inventory.add(Repo.from_label(repo))
 
     @staticmethod
+    @screen_operation
     def add_docker_container(connection, containername, containerid="", displayname=""):
         '''
         add a new Red Hat docker container
@@ -143,44 +202,67 @@ class RHUIManagerRepo(object):
          "Display Name: " + displayname,
          "Upstream Container Name: " + containername])
         RHUIManager.quit(connection)
+        if displayname:
+            RepoInventory.get(connection).add(Repo(displayname, kind="Docker",
+                                                   repo_id=containerid or containername.replace("/","_").replace(".","_")))
+        else:
+            # the label is up to rhui-manager
+            RepoInventory.get(connection).invalidate()
 
     @staticmethod
+    @screen_operation
     def list(connection):
         '''
         list repositories
+        the repository inventory of the connection is updated from the listing
         '''
         RHUIManager.screen(connection, "repo")
-        Expect.enter(connection, "l")
         # eating prompt!!
-        pattern = re.compile('l\r\n(.*)\r\n-+\r\nrhui\s* \(repo\)\s* =>',
-                re.DOTALL)
-        ret = Expect.match(connection, pattern, grouplist=[1])[0]
-        reslist = map(lambda x: x.strip(), ret.split("\r\n"))
+        lines = RHUIManager.list_lines(connection, screen_prompt("repo"))
         repolist = []
-        for line in reslist:
+        for line in RHUIManagerRepo._listing(lines):
             if line in ["", "Custom Repositories", "Red Hat Repositories", "OSTree", "Docker", "Yum", "No repositories are currently managed by the RHUI"]:
                 continue
             repolist.append(line)
-        Expect.enter(connection, 'q')
+        RHUIManager.release(connection)
+        RepoInventory.get(connection).load(repolist)
         return repolist
 
+    @staticmethod
+    def _listing(lines, echo=True):
+        '''
+        (internally used) strip the lines of a listing on the repo screen;
+        drop the echoed command and the separator above the prompt
+        '''
+        lines = [line.strip() for line in lines]
+        if echo and lines and lines[0] == "l":
+            lines = lines[1:]
+        if lines and lines[-1] == "":
+            lines = lines[:-1]
+        if lines and lines[-1] and lines[-1].strip("-") == "":
+            lines = lines[:-1]
+        return lines
+
     @staticmethod
     def get_repo_version(connection, reponame):
         '''
-        get repo version
+        get repo version (from the repository inventory)
         '''
-        repolist = RHUIManagerRepo.list(connection)
         # delete escape back slash from the reponame
         reponame = reponame.replace("\\", "")
         # get full repo name with its version from the list of all repos
-        full_reponame = next((s for s in repolist if reponame in s), None)
-        #return full_reponame
+        repo = RepoInventory.get(connection).find(reponame)
+        if repo is None:
+            raise ExpectFailed("No such repo: " + reponame)
+        if repo.version:
+            return repo.version
         # get its version
-        repo_version = re.sub('^.*\((.*?)\)[^\(]*$', '\g<1>', full_reponame)
+        repo_version = re.sub('^.*\((.*?)\)[^\(]*$', '\g<1>', repo.label)
 
         return repo_version
 
     @staticmethod
+    @screen_operation
     def delete_repo(connection, repolist):
         '''
         delete a repository from the RHUI
@@ -190,8 +272,10 @@ class RHUIManagerRepo(object):
         RHUIManager.select(connection, repolist)
         RHUIManager.proceed_without_check(connection)
         RHUIManager.quit(connection)
+        RepoInventory.get(connection).remove(repolist)
 
     @staticmethod
+    @screen_operation
     def delete_all_repos(connection):
         '''
         delete all repositories from the RHUI
@@ -205,47 +289,144 @@ class RHUIManagerRepo(object):
         RHUIManager.proceed_without_check(connection)
         # Wait until all repos are deleted
         RHUIManager.quit(connection, "", 360)
-        while len(RHUIManagerRepo.list(connection)) != 0:
-            time.sleep(10)
+        # (the listing updates the repository inventory)
+        Waiter(timeout=600, name="all repos to be deleted").until(lambda: not RHUIManagerRepo.list(connection))
 
     @staticmethod
-    def upload_content(connection, repolist, path):
+    @screen_operation
+    def upload_content(connection, repolist, path, chunk_size=None):
         '''
         upload content to a custom repository
+        if path is a directory with more than chunk_size RPM files, upload them in chunks
+        of at most chunk_size files, all in one rhui-manager session; the chunks are
+        directories of symbolic links in /tmp on RHUA, removed after each chunk whatever
+        the outcome (a failure to remove them is only logged)
+        return {"files": number of files, "bytes": their total size, "seconds": upload time,
+                "files_per_second": ..., "mb_per_second": ...}
         '''
-        # Temporarily quit rhui-manager and check whether "path" is a file or a directory.
+        # Check whether "path" is a file or a directory over SFTP, leaving rhui-manager alone.
         # If it is a directory, get a list of *.rpm files in it.
-        Expect.enter(connection, 'q')
-        Expect.enter(connection, "stat -c %F " + path)
-        path_type = Expect.expect_list(connection, [(re.compile(".*regular file.*", re.DOTALL), 1), (re.compile(".*directory.*", re.DOTALL), 2)])
-        if path_type == 1:
-            content = [basename(path)]
-        elif path_type == 2:
-            Expect.enter(connection, "echo " + path + "/*.rpm")
-            output = Expect.match(connection, re.compile("(.*)", re.DOTALL))[0]
-            rpm_files = output.splitlines()[1]
-            content = []
-            for rpm_file in rpm_files.split():
-                content.append(basename(rpm_file))
+        files = RHUIManagerRepo._rpm_files(connection, path)
+        if chunk_size and len(files) > chunk_size:
+            chunks = [files[start:start + chunk_size] for start in range(0, len(files), chunk_size)]
         else:
-            # This should not happen. Getting here means that "path" is neither a file nor a directory.
+            chunks = [files]
+        session = RHUIManagerSession.get(connection)
+        keep_alive = session.keep_alive
+        session.keep_alive = True
+        seconds = 0.0
+        try:
+            for chunk in chunks:
+                if len(chunks) == 1:
+                    upload_path = path
+                else:
+                    upload_path = RHUIManagerRepo._link_chunk(connection, path, chunk)
+                try:
+                    start = time.time()
+                    RHUIManager.screen(connection, "repo")
+                    Expect.enter(connection, "u")
+                    RHUIManager.select(connection, repolist)
+                    Expect.expect(connection, "will be uploaded:")
+                    Expect.enter(connection, upload_path)
+                    RHUIManager.proceed_with_check(connection, "The following RPMs will be uploaded:",
+                                                   [name for name, _ in chunk])
+                    Expect.expect(connection, ".*rhui \(.*\) =>", 360)
+                    seconds += time.time() - start
+                finally:
+                    if upload_path != path:
+                        RHUIManagerRepo._unlink_chunk(connection, upload_path, chunk)
+        finally:
+            session.keep_alive = keep_alive
+        RHUIManager.release(connection)
+        size = sum([file_size for _, file_size in files])
+        stats = {"files": len(files),
+                 "bytes": size,
+                 "seconds": seconds,
+                 "files_per_second": len(files) / seconds if seconds > 0 else 0.0,
+                 "mb_per_second": size / 1048576.0 / seconds if seconds > 0 else 0.0}
+        logging.debug("Uploaded %(files)s files, %(bytes)s bytes, in %(seconds).1f s: "
+                      "%(files_per_second).2f files/s, %(mb_per_second).2f MB/s" % stats)
+        return stats
+
+    @staticmethod
+    def _rpm_files(connection, path):
+        '''
+        (internally used) return [(file name, size)] of the file, or of the *.rpm files
+        in the directory, at the path
+        '''
+        try:
+            attributes = connection.sftp.stat(path)
+        except IOError:
+            # This should not happen. Getting here means that "path" doesn't exist.
             # Anyway, going on with no content, leaving it up to proceed_with_check() to handle this situation.
-            content = []
-        # Start rhui-manager again and continue.
-        RHUIManager.initial_run(connection)
-        RHUIManager.screen(connection, "repo")
-        Expect.enter(connection, "u")
-        RHUIManager.select(connection, repolist)
-        Expect.expect(connection, "will be uploaded:")
-        Expect.enter(connection, path)
-        RHUIManager.proceed_with_check(connection, "The following RPMs will be uploaded:", content)
-        RHUIManager.quit(connection)
+            return []
+        if stat.S_ISDIR(attributes.st_mode):
+            return sorted([(entry.filename, entry.st_size) for entry in connection.sftp.listdir_attr(path)
+                           if entry.filename.endswith(".rpm") and not entry.filename.startswith(".")])
+        if stat.S_ISREG(attributes.st_mode):
+            return [(basename(path), attributes.st_size)]
+        return []
+
+    @staticmethod
+    def _link_chunk(connection, path, chunk):
+        '''
+        (internally used) create a directory with symbolic links to the files of the chunk
+        in the directory at the path, return the path of the new directory
+        '''
+        chunk_path = "/tmp/rhui3-upload-%08x" % random.getrandbits(32)
+        connection.sftp.mkdir(chunk_path)
+        linked = []
+        try:
+            for name, size in chunk:
+                connection.sftp.symlink(posixpath.join(path, name), posixpath.join(chunk_path, name))
+                linked.append((name, size))
+        finally:
+            # (not in an except clause: in Python 2, a bare raise after the errors handled
+            # while unlinking would re-raise the wrong one)
+            if len(linked) < len(chunk):
+                RHUIManagerRepo._unlink_chunk(connection, chunk_path, linked)
+        return chunk_path
+
+    @staticmethod
+    def _unlink_chunk(connection, chunk_path, chunk):
+        '''
+        (internally used) remove the directory with symbolic links to the files of the chunk;
+        the errors are only logged, so that they don't replace an error of the upload
+        '''
+        for name, _ in chunk:
+            try:
+                connection.sftp.remove(posixpath.join(chunk_path, name))
+            except (IOError, OSError) as err:
+                logging.warning("Couldn't remove %s: %s" % (posixpath.join(chunk_path, name), err))
+        try:
+            connection.sftp.rmdir(chunk_path)
+        except (IOError, OSError) as err:
+            logging.warning("Couldn't remove %s: %s" % (chunk_path, err))
 
     @staticmethod
     def check_for_package(connection, reponame, package):
         '''
         list packages in a repository
         '''
+        return list(RHUIManagerRepo.iter_packages(connection, reponame, package))
+
+    @staticmethod
+    def has_package(connection, reponame, package):
+        '''
+        check if the package is in the repository; stop reading the listing as soon as it shows up
+        '''
+        for nvr in RHUIManagerRepo.iter_packages(connection, reponame, package):
+            if nvr == package:
+                return True
+        return False
+
+    @staticmethod
+    @screen_operation
+    def iter_packages(connection, reponame, package):
+        '''
+        list packages in a repository, generate the package NVRs as the listing arrives
+        if the generator is closed early, the rest of the listing is read and dropped
+        '''
         RHUIManager.screen(connection, "repo")
         Expect.enter(connection, "p")
 
@@ -253,21 +434,185 @@ class RHUIManagerRepo(object):
         Expect.expect(connection, "\(blank line for no filter\):")
         Expect.enter(connection, package)
 
-        pattern = re.compile('.*only\.\r\n(.*)\r\n-+\r\nrhui\s* \(repo\)\s* =>',
-                             re.DOTALL)
-        ret = Expect.match(connection, pattern, grouplist=[1])[0]
-        reslist = map(lambda x: x.strip(), ret.split("\r\n"))
-        packagelist = []
-        for line in reslist:
-            if line == '':
-                continue
-            if line == 'Packages:':
-                continue
-            if line == 'No packages found that match the given filter.':
-                continue
-            if line == 'No packages in the repository.':
-                continue
-            packagelist.append(line)
-        Expect.enter(connection, 'q')
-        return packagelist
+        lines = PromptScanner([screen_prompt("repo")]).lines(connection)
+        listing = False
+        try:
+            for line in lines:
+                if line.endswith("only."):
+                    listing = True
+                    continue
+                line = line.strip()
+                if not listing or line in PACKAGE_LISTING_NOISE or line.strip("-") == "":
+                    continue
+                yield line
+        except GeneratorExit:
+            # the caller has stopped early, drain the listing up to the prompt
+            for _ in lines:
+                pass
+            RHUIManager.release(connection)
+            raise
+        RHUIManager.release(connection)
+        if not listing:
+            raise ExpectFailed("No package listing")
+
+class RepoInventory(object):
+    '''
+    The repositories managed by the RHUI, cached per connection.
+
+    The inventory is read from one listing of the repository screen when it's needed,
+    and then the RHUIManagerRepo methods adding and deleting repositories keep it
+    up to date, so lookups don't launch rhui-manager and scrape the screen again.
+    It's read again if it has been invalidated (after operations whose outcome isn't
+    known in advance, such as adding all the repositories in the certificate or adding
+    repositories through RHUIManagerCLI) or if it's older than max_age seconds. Every listing done by RHUIManagerRepo.list()
+    is taken over by the inventory too.
+
+    The repositories are Repo records indexed by the ID (if known: the repositories added
+    through the inventory), the display name, the version and the kind.
+    '''
+    _inventories = weakref.WeakKeyDictionary()
+    max_age = 600
+
+    def __init__(self, connection):
+        self.connection = connection
+        # Repo records in the on-screen order: the custom repositories (without a kind),
+        # then the others, each sorted by the label
+        self.repos = []
+        # the time of the latest listing, None if the inventory isn't valid
+        self.loaded = None
+        self._by_id = {}
+        self._by_name = {}
+        self._by_version = {}
+        self._by_kind = {}
+
+    @classmethod
+    def get(cls, connection):
+        '''
+        return the inventory of the given connection, create it if necessary
+        '''
+        inventory = cls._inventories.get(connection)
+        if inventory is None:
+            inventory = cls(connection)
+            cls._inventories[connection] = inventory
+        return inventory
+
+    @property
+    def valid(self):
+        '''
+        True if the inventory has been read and isn't stale
+        '''
+        return self.loaded is not None and time.time() - self.loaded <= self.max_age
+
+    def invalidate(self):
+        '''
+        read the inventory again when it's needed next time
+        '''
+        self.loaded = None
+
+    def refresh(self):
+        '''
+        read the inventory from the repository screen now
+        '''
+        RHUIManagerRepo.list(self.connection)
+
+    def load(self, labels):
+        '''
+        take over the repositories listed as the labels; the IDs known so far are kept
+        '''
+        ids = dict([(repo.label, repo.repo_id) for repo in self.repos if repo.repo_id])
+        self.repos = [Repo.from_label(label, ids.get(label)) for label in labels]
+        self.loaded = time.time()
+        self._index()
+
+    def _index(self):
+        '''
+        (internally used) build the indexes
+        '''
+        self._by_id = {}
+        self._by_name = {}
+        self._by_version = {}
+        self._by_kind = {}
+        for repo in self.repos:
+            if repo.repo_id:
+                self._by_id[repo.repo_id] = repo
+            self._by_name.setdefault(repo.name, []).append(repo)
+            self._by_version.setdefault(repo.version, []).append(repo)
+            self._by_kind.setdefault(repo.kind, []).append(repo)
+
+    def add(self, repo):
+        '''
+        a repository has been added
+        '''
+        if self.loaded is None:
+            return
+        self.repos = sorted([other for other in self.repos if other.label != repo.label] + [repo],
+                            key=lambda other: (other.kind is not None, other.label))
+        self._index()
 
+    def remove(self, values):
+        '''
+        repositories have been deleted; the values are labels or the ends of labels,
+        as with RHUIManager.select() (see label_pattern)
+        '''
+        if self.loaded is None:
+            return
+        for value in values:
+            repo = next((repo for repo in self.repos if repo.label == value), None)
+            if repo is None:
+                pattern = label_pattern("(?:^|\\s)%s\\s*$", value, 0)
+                repo = next((repo for repo in reversed(self.repos) if pattern.search(repo.label)), None)
+            if repo is None:
+                # something else than expected has been deleted
+                self.invalidate()
+                return
+            self.repos.remove(repo)
+        self._index()
+
+    def _current(self):
+        '''
+        (internally used) make sure the inventory is valid
+        '''
+        if not self.valid:
+            self.refresh()
+
+    def labels(self):
+        '''
+        return the labels of the repositories as listed by rhui-manager
+        '''
+        self._current()
+        return [repo.label for repo in self.repos]
+
+    def find(self, text):
+        '''
+        return the first repository whose label contains the text, None if there's no such repository
+        '''
+        self._current()
+        return next((repo for repo in self.repos if text in repo.label), None)
+
+    def by_id(self, repo_id):
+        '''
+        return the repository with the given ID, None if there's no such (known) repository
+        '''
+        self._current()
+        return self._by_id.get(repo_id)
+
+    def by_name(self, name):
+        '''
+        return the list of the repositories with the given display name
+        '''
+        self._current()
+        return list(self._by_name.get(name, []))
+
+    def with_version(self, version):
+        '''
+        return the list of the repositories with the given version
+        '''
+        self._current()
+        return list(self._by_version.get(version, []))
+
+    def of_kind(self, kind):
+        '''
+        return the list of the repositories of the given kind (Yum, Docker, OSTree, None for custom ones)
+        '''
+        self._current()
+        return list(self._by_kind.get(kind, []))
@@ -1,17 +1,16 @@
 """ Red Hat subscription registration in RHUI """
 
-import re
-
 from stitches.expect import Expect
-from rhui3_tests_lib.rhuimanager import RHUIManager
+from rhui3_tests_lib.promptscanner import PromptScanner
+from rhui3_tests_lib.rhuimanager import RHUIManager, screen_prompt, screen_operation
 
 class RHUIManagerSubMan(object):
     '''
     Represents -= Subscriptions Manager =- RHUI screen
     '''
-    prompt = r'rhui \(subscriptions\) => '
 
     @staticmethod
+    @screen_operation
     def subscriptions_list(connection, what):
         '''
         list registered or available subscriptions
@@ -25,17 +24,17 @@ class RHUIManagerSubMan(object):
 
         RHUIManager.screen(connection, "subscriptions")
         Expect.enter(connection, key)
-        lines = Expect.match(connection, re.compile("(.*)" + RHUIManagerSubMan.prompt,
-                                                    re.DOTALL))[0]
+        lines = PromptScanner.read_until(connection, [screen_prompt("subscriptions")])
         sub_list = []
         for line in lines.splitlines():
             # subscription names are on lines that start with two spaces
             if line[:2] == "  ":
                 sub_list.append(line.strip())
-        Expect.enter(connection, 'q')
+        RHUIManager.release(connection)
         return sub_list
 
     @staticmethod
+    @screen_operation
     def subscriptions_register(connection, names):
         '''
         register a Red Hat subscription in RHUI
@@ -49,6 +48,7 @@ class RHUIManagerSubMan(object):
         RHUIManager.quit(connection)
 
     @staticmethod
+    @screen_operation
     def subscriptions_unregister(connection, names):
         '''
         unregister a Red Hat subscription from RHUI
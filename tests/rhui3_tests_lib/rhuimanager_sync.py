@@ -1,10 +1,21 @@
 """ RHUIManager Sync functions """
 
-import re, nose, time
+import logging, nose, re, threading, time
 
-from stitches.expect import Expect
-from rhui3_tests_lib.rhuimanager import RHUIManager
+from stitches.expect import Expect, ExpectFailed
+from rhui3_tests_lib.patterncache import PATTERNS
+from rhui3_tests_lib.rhuimanager import RHUIManager, RHUIManagerSession, screen_operation
+from rhui3_tests_lib.syncstatus import SyncStatusTable
 from rhui3_tests_lib.util import Util
+from rhui3_tests_lib.waiter import Waiter, WaitTimeout
+
+# a repo line in the (uncolored) output of "rhui-manager status": the name,
+# padded with spaces or dots, and the result in brackets at the end of the line
+CLI_STATUS_LINE = re.compile(r"^(\S.*?)[ .]*\[ *([A-Za-z]+(?: [A-Za-z]+)*) *\] *$")
+# the number of seconds to wait for a sync to finish by default
+SYNC_TIMEOUT = 7200
+# the number of seconds to wait for a sync to start by default
+SYNC_START_TIMEOUT = 600
 
 
 class RHUIManagerSync(object):
@@ -12,6 +23,7 @@ class RHUIManagerSync(object):
     Represents -= Synchronization Status =- RHUI screen
     '''
     @staticmethod
+    @screen_operation
     def sync_repo(connection, repolist):
         '''
         sync an individual repository immediately
@@ -28,44 +40,273 @@ class RHUIManagerSync(object):
     def get_repo_status(connection, reponame):
         '''
         display repo sync summary
+        return [next sync, last sync, last result] of the repo
+        raises ExpectFailed if the repo isn't listed
+        '''
+        status = RHUIManagerSync._read_summary(connection, [reponame]).status(reponame)
+        return [status.next_sync, status.last_sync, status.result]
+
+    @staticmethod
+    def get_repo_statuses(connection, repolist=None):
+        '''
+        display repo sync summary
+        return {repo name: SyncStatus} of the repos listed in it;
+        if repolist is specified, only the statuses of those repos are guaranteed to be read
+        '''
+        return RHUIManagerSync._read_summary(connection, repolist).statuses
+
+    @staticmethod
+    @screen_operation
+    def _read_summary(connection, repolist=None):
+        '''
+        (internally used) read the sync summary (until the statuses of the repos if specified),
+        return the SyncStatusTable
         '''
         RHUIManager.screen(connection, "sync")
         Expect.enter(connection, "dr")
-        reponame_quoted = Util.esc_parentheses(reponame)
-        res = Expect.match(connection, re.compile(".*" + reponame_quoted + "\s*\r\n([^\n]*)\r\n.*", re.DOTALL), [1], 60)[0]
+        table = SyncStatusTable()
+        table.read(connection, repolist)
         connection.cli.exec_command("killall -s SIGINT rhui-manager")
-        res = Util.uncolorify(res)
-        ret_list = res.split("             ")
-        for i in range(len(ret_list)):
-            ret_list[i] = ret_list[i].strip()
-
+        RHUIManagerSession.get(connection).invalidate()
         Expect.enter(connection, '\x03')
         Expect.enter(connection, 'q')
-        return ret_list
+        return table
 
     @staticmethod
-    def check_sync_started(connection, repolist):
-        '''ensure that sync started'''
+    def check_sync_started(connection, repolist, timeout=SYNC_START_TIMEOUT):
+        '''
+        ensure that sync started
+        timeout is the number of seconds to wait at most (SYNC_START_TIMEOUT by default,
+        None to wait as long as it takes); raises WaitTimeout if the sync doesn't start in time
+        '''
+        watcher = SyncWatcher(connection, repolist, Waiter(timeout=timeout, name="sync to start"))
+        watcher.wait(lambda status: status.result in ["Never", "Unknown"])
         for repo in repolist:
-            reposync = ["", "", "Never"]
-            while reposync[2] in ["Never", "Unknown"]:
-                time.sleep(10)
-                reposync = RHUIManagerSync.get_repo_status(connection, repo)
-            if reposync[2] in ["Running", "Success"]:
-                pass
-            else:
+            if watcher.statuses[repo].result not in ["Running", "Success"]:
                 raise TypeError("Something went wrong")
 
     @staticmethod
-    def wait_till_repo_synced(connection, repolist):
+    def wait_till_repo_synced(connection, repolist, events=False, timeout=None):
         '''
         wait until repo is synced
+        the sync summary is read periodically; if events is True, the sync state
+        is followed on RHUA with a SyncTaskMonitor instead
+        timeout is the number of seconds to wait at most (SYNC_TIMEOUT by default)
         '''
+        if events:
+            monitor = SyncTaskMonitor(connection)
+            try:
+                results = monitor.wait(repolist, timeout or SYNC_TIMEOUT)
+            finally:
+                monitor.stop()
+        else:
+            watcher = SyncWatcher(connection, repolist, Waiter(timeout=timeout or SYNC_TIMEOUT, name="sync"))
+            watcher.wait(lambda status: status.result in ["Running", "Never", "Unknown"],
+                         lambda status: status.result == "Error")
+            results = dict([(repo, watcher.statuses[repo].result) for repo in repolist])
+        # the wait stops at the first Error, possibly with other repos still running
+        if "Error" in results.values():
+            raise TypeError("The repo sync returned Error")
         for repo in repolist:
-            reposync = ["", "", "Running"]
-            while reposync[2] in ["Running", "Never", "Unknown"]:
-                time.sleep(10)
-                reposync = RHUIManagerSync.get_repo_status(connection, repo)
-            if reposync[2] == "Error":
-                raise TypeError("The repo sync returned Error")
-            nose.tools.assert_equal(reposync[2], "Success")
+            nose.tools.assert_equal(results[repo], "Success")
+
+class SyncWatcher(object):
+    '''
+    Watch the sync status of several repos.
+
+    Every cycle reads the sync summary once and updates all the repos from it,
+    instead of visiting the summary once per repo. The cycles are timed by the waiter
+    (by default a Waiter with SYNC_TIMEOUT).
+    '''
+    def __init__(self, connection, repolist, waiter=None):
+        self.connection = connection
+        self.repolist = list(repolist)
+        self.waiter = waiter or Waiter(timeout=SYNC_TIMEOUT, name="sync")
+        # repo -> the latest SyncStatus
+        self.statuses = {}
+        # repo -> seconds from the start of the wait until the repo was done
+        self.completed = {}
+        self.cycles = 0
+
+    def refresh(self):
+        '''
+        read the sync summary once, update the statuses of all the repos
+        raises ExpectFailed if a repo isn't listed
+        '''
+        table = RHUIManagerSync._read_summary(self.connection, self.repolist)
+        for repo in self.repolist:
+            self.statuses[repo] = table.status(repo)
+        self.cycles += 1
+
+    def wait(self, pending, failed=None):
+        '''
+        wait until none of the repos is pending
+        pending and failed are functions of a SyncStatus; a repo is done when its status
+        isn't pending, and the wait stops early if a repo is done and its status is failed
+        return {repo: seconds it took the repo to be done}
+        raises WaitTimeout if the repos aren't done in time
+        '''
+        start = time.time()
+        waiting = list(self.repolist)
+
+        def done():
+            '''read the summary, return True if the wait is over'''
+            self.refresh()
+            for repo in list(waiting):
+                status = self.statuses[repo]
+                if not pending(status):
+                    self.completed[repo] = time.time() - start
+                    waiting.remove(repo)
+                    logging.debug("%s done after %.1f s: %s" % (repo, self.completed[repo], status.result))
+                    if failed is not None and failed(status):
+                        return True
+            return not waiting
+
+        self.waiter.until(done)
+        logging.debug("Done after %s summary reads" % self.cycles)
+        logging.debug("Pattern cache: " + str(PATTERNS.stats()))
+        return self.completed
+
+class SyncTaskMonitor(object):
+    '''
+    Follow the sync state of the repos on RHUA over one long-lived exec channel.
+
+    A loop on RHUA follows the log Pulp writes to (log) and runs "rhui-manager status"
+    when a Pulp task finishes, or every interval seconds if no task has finished in the
+    meantime (the log may be rotated or not be where expected); the output is sent over
+    the channel only when it has changed, and a thread reads it and wakes the waiters as
+    soon as a new state arrives. So the state is checked once per finished task rather
+    than periodically, and there's no need to launch rhui-manager in the shell, nor to
+    open a new SSH channel, for every check. The repos are looked up under their exact
+    names in the output. wait_till_repo_synced uses the monitor only if asked to.
+    '''
+    MARKER = "==rhui3-tests-sync-state=="
+    # a log line about a finished Pulp (celery) task
+    TASK_DONE_PATTERN = "pulp.*Task .*(succeeded|raised|failed)"
+    # states in which a sync isn't over yet
+    PENDING = ["Running", "Never", "Unknown"]
+
+    def __init__(self, connection, interval=10, log="/var/log/messages"):
+        self.connection = connection
+        self.interval = interval
+        self.log = log
+        self.condition = threading.Condition()
+        # the lines of the latest output of rhui-manager status
+        self.lines = []
+        # repo name -> result, parsed from the lines
+        self.results = {}
+        self.updates = 0
+        self.closed = False
+        self.channel = None
+        self.thread = None
+
+    def script(self):
+        '''
+        return the script following the sync state on RHUA
+        '''
+        # read returns on a finished task or after the interval (status > 128),
+        # or at once if the log can't be followed at all, in which case sleep
+        return "tail -n0 -F %s 2>/dev/null | grep --line-buffered -E '%s' | " % (self.log, self.TASK_DONE_PATTERN) + \
+               "{ prev=; while :; do cur=$(rhui-manager status 2>&1); " + \
+               "if [ \"$cur\" != \"$prev\" ]; then printf '%%s\\n%s\\n' \"$cur\"; prev=$cur; fi; " % self.MARKER + \
+               "read -t %s line || [ $? -gt 128 ] || sleep %s; done; }" % (self.interval, self.interval)
+
+    def start(self):
+        '''
+        start following the sync state (done on the first wait if not called before)
+        '''
+        if self.thread is not None:
+            return
+        # with a pty, the loop is terminated when the channel is closed
+        _, stdout, _ = self.connection.cli.exec_command(self.script(), get_pty=True)
+        self.channel = stdout.channel
+        self.thread = threading.Thread(target=self._read, args=(stdout,))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self, timeout=10):
+        '''
+        stop following the sync state, close the channel, wait for the reader thread
+        '''
+        if self.channel is not None:
+            self.channel.close()
+        self.channel = None
+        if self.thread is not None:
+            self.thread.join(timeout)
+        self.thread = None
+
+    def _read(self, stdout):
+        '''
+        (internally used) read the state updates until the channel is closed
+        '''
+        block = []
+        try:
+            for line in stdout:
+                if not isinstance(line, str):
+                    line = line.decode("utf-8", "replace")
+                line = Util.uncolorify(line).rstrip("\r\n")
+                if line != self.MARKER:
+                    block.append(line)
+                    continue
+                with self.condition:
+                    self.lines = block
+                    self.results = SyncTaskMonitor.parse(block)
+                    self.updates += 1
+                    self.condition.notify_all()
+                block = []
+        except (EOFError, IOError, OSError):
+            # the channel has been closed
+            pass
+        finally:
+            with self.condition:
+                self.closed = True
+                self.condition.notify_all()
+
+    @staticmethod
+    def parse(lines):
+        '''
+        return {repo name: result} of the (uncolored) lines of the output of rhui-manager status;
+        the lines without a result in brackets are skipped
+        '''
+        results = {}
+        for line in lines:
+            match = CLI_STATUS_LINE.match(line.strip())
+            if match is not None:
+                results[match.group(1)] = match.group(2)
+        return results
+
+    def status(self, repo):
+        '''
+        return the latest known status of the repo (listed under exactly this name),
+        "Unknown" if it isn't known
+        '''
+        return self.results.get(repo, "Unknown")
+
+    def wait(self, repolist, timeout=None):
+        '''
+        wait until the syncs of all the repos are over or one of them has failed
+        return {repo: status}
+        raises ExpectFailed if the states stop coming, WaitTimeout if the timeout passes
+        '''
+        self.start()
+        start = time.time()
+        done = {}
+        with self.condition:
+            while True:
+                for repo in repolist:
+                    if repo not in done and self.updates and self.status(repo) not in self.PENDING:
+                        done[repo] = time.time() - start
+                        logging.debug("%s done after %.1f s: %s" % (repo, done[repo], self.status(repo)))
+                results = dict([(repo, self.status(repo)) for repo in repolist])
+                if len(done) == len(repolist) or "Error" in [results[repo] for repo in done]:
+                    logging.debug("Done after %s state updates" % self.updates)
+                    return results
+                if self.closed:
+                    raise ExpectFailed("The sync state channel has been closed")
+                if timeout is not None:
+                    remaining = start + timeout - time.time()
+                    if remaining <= 0:
+                        raise WaitTimeout("Waiting for sync timed out after %s seconds: %s" % (timeout, results))
+                    self.condition.wait(remaining)
+                else:
+                    self.condition.wait()
@@ -1,133 +1,405 @@
 """ RHUIManagerCLI functions """
 
-import nose, re, time
+import logging, nose, random, re, socket, threading, time
 
-from stitches.expect import Expect
+from stitches.expect import ExpectFailed
+from rhui3_tests_lib.patterncache import PATTERNS
+from rhui3_tests_lib.records import Record
+from rhui3_tests_lib.rhuimanager_repo import RepoInventory
+from rhui3_tests_lib.rhuimanager_sync import SYNC_TIMEOUT
 from rhui3_tests_lib.util import Util
+from rhui3_tests_lib.waiter import Waiter
+
+# the header of the output of "rhui-manager repo list"
+REPO_LIST_HEADER = re.compile("ID.*Repository Name$")
+
+class CommandResult(Record):
+    """The outcome of a command run over an exec channel"""
+    __slots__ = ("command", "status", "stdout", "stderr", "seconds")
+
+    def __init__(self, command, status, stdout="", stderr="", seconds=0.0):
+        Record.__init__(self, command, status, stdout, stderr, seconds)
+
+    @property
+    def output(self):
+        """
+        stdout and stderr together, as they'd show up in a terminal
+        """
+        return self.stdout + self.stderr
+
+class CLIRunner(object):
+    '''
+    Run commands on RHUA over exec channels of the SSH transport of a connection.
+
+    Every command gets a channel of its own, so its exit status, stdout and stderr
+    come back separately and nothing is read from the shared interactive shell;
+    independent commands can run concurrently on the same transport.
+    '''
+    def __init__(self, connection, timeout=300):
+        self.connection = connection
+        self.timeout = timeout
+
+    def run(self, command):
+        '''
+        run the command, return its CommandResult
+        raises ExpectFailed if the command doesn't finish in self.timeout seconds
+        '''
+        start = time.time()
+        deadline = start + self.timeout
+
+        def remaining():
+            '''return the number of seconds left, raise ExpectFailed if there are none'''
+            left = deadline - time.time()
+            if left <= 0:
+                raise ExpectFailed("Command '%s' didn't finish in %s seconds" % (command, self.timeout))
+            return left
+
+        channel = self.connection.cli.get_transport().open_session()
+        try:
+            channel.exec_command(command)
+            stdout = []
+            stderr = []
+            # stdout is read in short slices and stderr is drained between them,
+            # so that the command never stalls on a full stderr window; the slices
+            # are shorter while stderr keeps coming
+            while True:
+                wait = 0.1
+                while channel.recv_stderr_ready():
+                    stderr.append(channel.recv_stderr(65536))
+                    wait = 0.001
+                channel.settimeout(min(remaining(), wait))
+                try:
+                    data = channel.recv(65536)
+                except socket.timeout:
+                    continue
+                if not data:
+                    break
+                stdout.append(data)
+            while True:
+                channel.settimeout(remaining())
+                try:
+                    data = channel.recv_stderr(65536)
+                except socket.timeout:
+                    remaining()
+                    continue
+                if not data:
+                    break
+                stderr.append(data)
+            while not channel.exit_status_ready():
+                time.sleep(min(remaining(), 0.01))
+            status = channel.recv_exit_status()
+        finally:
+            channel.close()
+        result = CommandResult(command, status,
+                               b"".join(stdout).decode("utf-8", "replace"),
+                               b"".join(stderr).decode("utf-8", "replace"),
+                               time.time() - start)
+        logging.debug("%s: exit status %s after %.2f s" % (command, status, result.seconds))
+        return result
+
+    def run_all(self, commands, workers=8):
+        '''
+        run the commands concurrently, at most workers of them at a time,
+        return the list of their CommandResults in the order of the commands
+        raises the first error of the commands once all of them have finished
+        '''
+        commands = list(commands)
+        results = [None] * len(commands)
+        errors = []
+        queue = list(enumerate(commands))
+        lock = threading.Lock()
+
+        def work():
+            '''run the commands from the queue until it's empty'''
+            while True:
+                with lock:
+                    if not queue:
+                        return
+                    index, command = queue.pop(0)
+                try:
+                    results[index] = self.run(command)
+                except Exception as error:
+                    errors.append(error)
+
+        threads = [threading.Thread(target=work) for _ in range(min(workers, len(commands)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return results
+
+    def run_batch(self, commands):
+        '''
+        run the commands one after another in a single remote shell script,
+        return the list of their CommandResults in the order of the commands
+
+        The output of every command is delimited by markers on both stdout and stderr,
+        and the exit status and the duration of every command are printed after it,
+        so all the commands cost one exec channel and one round trip.
+        raises ExpectFailed if the output of a command is missing
+        '''
+        commands = list(commands)
+        token = "rhui3-batch-%08x" % random.getrandbits(32)
+        script = ""
+        for index, command in enumerate(commands):
+            script += "echo '==BEGIN %s %s=='; echo '==BEGIN %s %s==' >&2; start=$(date +%%s.%%N)\n" % \
+                      (token, index, token, index)
+            script += "{ " + command + "\n} < /dev/null\n"
+            script += "status=$?; printf '\\n==END %s %s %%s %%s %%s==\\n' $status $start $(date +%%s.%%N); " % \
+                      (token, index)
+            script += "printf '\\n==END %s %s==\\n' >&2\n" % (token, index)
+        batch = self.run(script)
+        stdout_pattern = re.compile("==BEGIN %s (\\d+)==\n(.*?)\n==END %s \\1 (\\d+) (\\S+) (\\S+)==\n" %
+                                    (token, token), re.DOTALL)
+        stderr_pattern = re.compile("==BEGIN %s (\\d+)==\n(.*?)\n==END %s \\1==\n" % (token, token), re.DOTALL)
+        stdouts = dict([(int(match.group(1)), match.groups()[1:]) for match in stdout_pattern.finditer(batch.stdout)])
+        stderrs = dict([(int(match.group(1)), match.group(2)) for match in stderr_pattern.finditer(batch.stderr)])
+        results = []
+        for index, command in enumerate(commands):
+            if index not in stdouts:
+                raise ExpectFailed("No output of '%s' in the batch: %s" % (command, batch.output.strip()))
+            stdout, status, start, end = stdouts[index]
+            results.append(CommandResult(command, int(status), stdout, stderrs.get(index, ""),
+                                         float(end) - float(start)))
+        logging.debug("%s commands in one batch after %.2f s" % (len(commands), batch.seconds))
+        return results
 
 class RHUIManagerCLI(object):
     '''
     The RHUI manager command-line interface (shell commands to control the RHUA).
+
+    The commands run over exec channels (see CLIRunner), not in the interactive shell.
     '''
+    @staticmethod
+    def _run(connection, command):
+        '''
+        (internally used) run the command, make sure it exits with 0, return the CommandResult
+        '''
+        result = CLIRunner(connection).run(command)
+        if result.status != 0:
+            raise ExpectFailed("Got %s exit status (0 expected) from '%s': %s" %
+                               (result.status, command, result.output.strip()))
+        return result
+
+    @staticmethod
+    def _check(connection, command, pattern):
+        '''
+        (internally used) run the command, make sure its output matches the pattern,
+        return the CommandResult
+        '''
+        result = CLIRunner(connection).run(command)
+        if not re.search(pattern, Util.uncolorify(result.output), re.DOTALL):
+            raise ExpectFailed("'%s' not found in the output of '%s': %s" %
+                               (pattern, command, result.output.strip()))
+        return result
+
+    @staticmethod
+    def run_all(connection, commands):
+        '''
+        run the independent commands concurrently, return the list of their CommandResults
+        '''
+        return CLIRunner(connection).run_all(commands)
+
+    @staticmethod
+    def run_batch(connection, commands):
+        '''
+        run the commands in one remote script, return the list of their CommandResults
+        '''
+        return CLIRunner(connection).run_batch(commands)
+
+    @staticmethod
+    def check_batch(connection, checks):
+        '''
+        run the commands of the checks, [(command, pattern), ...], in one remote script,
+        make sure the output of every command matches its pattern, return the CommandResults
+        raises ExpectFailed listing all the checks that have failed
+        '''
+        results = RHUIManagerCLI.run_batch(connection, [command for command, _ in checks])
+        failures = ["'%s' not found in the output of '%s'" % (pattern, result.command)
+                    for (_, pattern), result in zip(checks, results)
+                    if not re.search(pattern, Util.uncolorify(result.output), re.DOTALL)]
+        if failures:
+            raise ExpectFailed("; ".join(failures))
+        return results
+
     @staticmethod
     def cert_upload(connection, certificate_file, test_string):
         '''
         upload a new or updated Red Hat content certificate
         '''
-        Expect.ping_pong(connection, "rhui-manager cert upload --cert " + certificate_file, test_string)
+        RHUIManagerCLI._check(connection, "rhui-manager cert upload --cert " + certificate_file, test_string)
 
     @staticmethod
     def cert_info(connection):
         '''
         check the validity of the certificate
         '''
-        Expect.ping_pong(connection, "rhui-manager cert info", "Valid")
+        RHUIManagerCLI._check(connection, "rhui-manager cert info", "Valid")
 
     @staticmethod
     def repo_unused(connection, repo):
         '''
         check if a repo specified by its product name is available
         '''
-        Expect.ping_pong(connection, "rhui-manager repo unused", Util.esc_parentheses(repo))
+        RHUIManagerCLI._check(connection, "rhui-manager repo unused", Util.esc_parentheses(repo))
 
     @staticmethod
     def cert_expiration(connection):
         '''
         check if the certificate expiration date is OK
         '''
-        Expect.ping_pong(connection, "rhui-manager status", "Entitlement CA certificate expiration date.*OK")
+        RHUIManagerCLI._check(connection, "rhui-manager status", "Entitlement CA certificate expiration date.*OK")
 
     @staticmethod
     def repo_add(connection, repo):
         '''
         add a repo specified by its product name
         '''
-        Expect.ping_pong(connection, "rhui-manager repo add --product_name \"" + repo + "\"", "Successfully added")
+        RHUIManagerCLI._check(connection, "rhui-manager repo add --product_name \"" + repo + "\"", "Successfully added")
+        RepoInventory.get(connection).invalidate()
 
     @staticmethod
     def repo_add_by_repo(connection, repo_ids):
         '''
         add a repo specified by its ID
         '''
-        Expect.ping_pong(connection, "rhui-manager repo add_by_repo --repo_ids " + ",".join(repo_ids), "Successfully added")
+        RHUIManagerCLI._check(connection, "rhui-manager repo add_by_repo --repo_ids " + ",".join(repo_ids), "Successfully added")
+        RepoInventory.get(connection).invalidate()
 
     @staticmethod
     def repo_list(connection, repo_id, repo_name):
         '''
         check if the given repo ID and name are listed
         '''
-        Expect.ping_pong(connection, "rhui-manager repo list", repo_id + " *:: " + Util.esc_parentheses(repo_name))
+        RHUIManagerCLI._check(connection, "rhui-manager repo list", repo_id + " *:: " + Util.esc_parentheses(repo_name))
+
+    @staticmethod
+    def list_repo_ids(connection):
+        '''
+        return the set of the IDs of the listed repos
+        '''
+        output = RHUIManagerCLI._run(connection, "rhui-manager repo list").stdout
+        return set([line.split()[0] for line in Util.uncolorify(output).splitlines()
+                    if "::" in line and not REPO_LIST_HEADER.match(line)])
 
     @staticmethod
     def validate_repo_list(connection, repo_ids):
         '''
         check if only the given repo IDs are listed
-        '''
-        Expect.expect_retval(connection, "rhui-manager repo list | grep -v 'ID.*Repository Name$' | grep :: | cut -d ' ' -f 1 | sort > /tmp/actual_repo_list && echo \"" + "\n".join(sorted(repo_ids)) + "\" > /tmp/expected_repo_list && cmp /tmp/actual_repo_list /tmp/expected_repo_list")
-        Expect.ping_pong(connection, "rm -f /tmp/*_repo_list ; ls /tmp/*_repo_list 2>&1", "No such file or directory")
+        raises ExpectFailed naming the missing and the unexpected repo IDs if they aren't
+        '''
+        actual = RHUIManagerCLI.list_repo_ids(connection)
+        missing = sorted(set(repo_ids) - actual)
+        unexpected = sorted(actual - set(repo_ids))
+        if missing or unexpected:
+            raise ExpectFailed("Missing repos: %s; unexpected repos: %s" %
+                               (", ".join(missing) or "none", ", ".join(unexpected) or "none"))
 
     @staticmethod
     def get_repo_status(connection, repo_name):
         '''
         (internally used) method to get the status of the given repository
         '''
-        Expect.enter(connection, "rhui-manager status")
-        status = Expect.match(connection, re.compile(".*" + Util.esc_parentheses(repo_name) + "[^A-Z]*([A-Za-z]*).*", re.DOTALL))[0]
-        return status
+        return RHUIManagerCLI.get_repo_statuses(connection, [repo_name])[repo_name]
 
     @staticmethod
-    def repo_sync(connection, repo_id, repo_name):
+    def get_repo_statuses(connection, repo_names):
+        '''
+        (internally used) get the statuses of the given repositories from one run
+        and one scan of "rhui-manager status", return {repo name: status}
+        raises ExpectFailed if any of the repositories isn't in the status
+        '''
+        output = Util.uncolorify(RHUIManagerCLI._run(connection, "rhui-manager status").stdout)
+        # the longest names first so that a name doesn't match the beginning of another one
+        names = sorted(set(repo_names), key=len, reverse=True)
+        pattern = re.compile("(%s)[^A-Z]*([A-Za-z]*)" % "|".join([re.escape(name) for name in names]))
+        statuses = dict([match.groups() for match in pattern.finditer(output)])
+        missing = [name for name in repo_names if name not in statuses]
+        if missing:
+            raise ExpectFailed("%s not found in the status" % ", ".join(missing))
+        return statuses
+
+    @staticmethod
+    def repo_sync(connection, repo_id, repo_name, timeout=SYNC_TIMEOUT):
         '''
-        sync a repo
+        sync a repo, wait at most timeout seconds for the sync to finish
         '''
-        Expect.ping_pong(connection, "rhui-manager repo sync --repo_id " + repo_id, "successfully scheduled for the next available timeslot")
-        repo_status = RHUIManagerCLI.get_repo_status(connection, repo_name)
-        while repo_status in ["Never", "Running", "Unknown"]:
-            time.sleep(10)
-            repo_status = RHUIManagerCLI.get_repo_status(connection, repo_name)
-        nose.tools.assert_equal(repo_status, "Success")
+        RHUIManagerCLI.repo_sync_all(connection, [(repo_id, repo_name)], timeout)
+
+    @staticmethod
+    def repo_sync_all(connection, repos, timeout=SYNC_TIMEOUT):
+        '''
+        sync the repos, [(repo ID, repo name), ...], concurrently: schedule all of them
+        in one batch, then watch all of them in one "rhui-manager status" per cycle;
+        wait at most timeout seconds for all the syncs to finish
+        return {repo ID: (result, seconds from the scheduling until the sync was over)}
+        '''
+        RHUIManagerCLI.check_batch(connection,
+                                   [("rhui-manager repo sync --repo_id " + repo_id,
+                                     "successfully scheduled for the next available timeslot")
+                                    for repo_id, _ in repos])
+        start = time.time()
+        outcomes = {}
+
+        def finished():
+            '''return True if none of the syncs is in progress'''
+            waiting = [(repo_id, name) for repo_id, name in repos if repo_id not in outcomes]
+            statuses = RHUIManagerCLI.get_repo_statuses(connection, [name for _, name in waiting])
+            for repo_id, name in waiting:
+                if statuses[name] not in ["Never", "Running", "Unknown"]:
+                    outcomes[repo_id] = (statuses[name], time.time() - start)
+                    logging.debug("%s synced after %.1f s: %s" % (repo_id, outcomes[repo_id][1], statuses[name]))
+            return len(outcomes) == len(repos)
+
+        Waiter(timeout=timeout, name="sync of %s repos" % len(repos)).until(finished)
+        logging.debug("Pattern cache: " + str(PATTERNS.stats()))
+        failed = dict([(repo_id, result) for repo_id, (result, _) in outcomes.items() if result != "Success"])
+        nose.tools.assert_equal(failed, {})
+        return outcomes
 
     @staticmethod
     def repo_info(connection, repo_id, repo_name):
         '''
         check if information about the given repo can be displayed
         '''
-        Expect.ping_pong(connection, "rhui-manager repo info --repo_id " + repo_id, "Name: *" + Util.esc_parentheses(repo_name))
+        RHUIManagerCLI._check(connection, "rhui-manager repo info --repo_id " + repo_id, "Name: *" + Util.esc_parentheses(repo_name))
 
     @staticmethod
     def packages_list(connection, repo_id, package):
         '''
         check if a package is present in the repo
         '''
-        Expect.ping_pong(connection, "rhui-manager packages list --repo_id " + repo_id, package)
+        RHUIManagerCLI._check(connection, "rhui-manager packages list --repo_id " + repo_id, package)
 
     @staticmethod
     def packages_upload(connection, repo_id, package):
         '''
         upload a package to the custom repo
         '''
-        Expect.ping_pong(connection, "rhui-manager packages upload --repo_id " + repo_id + " --packages " + package, package + " successfully uploaded")
+        RHUIManagerCLI._check(connection, "rhui-manager packages upload --repo_id " + repo_id + " --packages " + package, package + " successfully uploaded")
 
     @staticmethod
     def repo_labels(connection, repo_label):
         '''
         check if the specified repo label is known
         '''
-        Expect.ping_pong(connection, "rhui-manager client labels", repo_label)
+        RHUIManagerCLI._check(connection, "rhui-manager client labels", repo_label)
 
     @staticmethod
     def client_cert(connection, repo_labels, name, days, dir):
         '''
         generate an entitlement certificate
         '''
-        Expect.ping_pong(connection, "rhui-manager client cert --repo_label " + ",".join(repo_labels) + " --name " + name + " --days " + str(days) + " --dir " + dir, "Entitlement certificate created at " + dir + "/" + name + ".crt")
+        RHUIManagerCLI._check(connection, "rhui-manager client cert --repo_label " + ",".join(repo_labels) + " --name " + name + " --days " + str(days) + " --dir " + dir, "Entitlement certificate created at " + dir + "/" + name + ".crt")
 
     @staticmethod
     def client_rpm(connection, private_key, entitlement_cert, rpm_version, rpm_name, dir, unprotected_repos=[]):
         '''
         generate a client configuration RPM
         '''
-        Expect.ping_pong(connection, "rhui-manager client rpm --private_key " + private_key + " --entitlement_cert " + entitlement_cert + " --rpm_version " + rpm_version + " --rpm_name " + rpm_name + " --dir " + dir + "%s" %(" --unprotected_repos " + ",".join(unprotected_repos) if len(unprotected_repos) > 0 else ""), "RPMs can be found at " + dir)
+        RHUIManagerCLI._check(connection, "rhui-manager client rpm --private_key " + private_key + " --entitlement_cert " + entitlement_cert + " --rpm_version " + rpm_version + " --rpm_name " + rpm_name + " --dir " + dir + "%s" %(" --unprotected_repos " + ",".join(unprotected_repos) if len(unprotected_repos) > 0 else ""), "RPMs can be found at " + dir)
 
     @staticmethod
     def subscriptions_list(connection, what="registered", poolonly=False):
@@ -140,10 +412,8 @@ class RHUIManagerCLI(object):
             poolswitch = " --pool-only"
         else:
             poolswitch = ""
-        _, stdout, _ = connection.exec_command("rhui-manager subscriptions list --" + what +
-                                               poolswitch)
-        with stdout as output:
-            sub_list = output.read().decode()
+        sub_list = RHUIManagerCLI._run(connection, "rhui-manager subscriptions list --" + what +
+                                       poolswitch).stdout
         # uncolorify to work around RHBZ#1577052
         return Util.uncolorify(sub_list).strip()
 
@@ -152,11 +422,11 @@ class RHUIManagerCLI(object):
         '''
         register the subscription to RHUI
         '''
-        Expect.expect_retval(connection, "rhui-manager subscriptions register --pool " + pool)
+        RHUIManagerCLI._run(connection, "rhui-manager subscriptions register --pool " + pool)
 
     @staticmethod
     def subscriptions_unregister(connection, pool):
         '''
         remove the subscription from RHUI
         '''
-        Expect.expect_retval(connection, "rhui-manager subscriptions unregister --pool " + pool)
+        RHUIManagerCLI._run(connection, "rhui-manager subscriptions unregister --pool " + pool)
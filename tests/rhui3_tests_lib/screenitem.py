@@ -4,6 +4,7 @@ Screen item module
 
 from rhui3_tests_lib import lineparser
 from rhui3_tests_lib import rhuimanager
+from rhui3_tests_lib.screensnapshot import ScreenSnapshot
 
 class NoSuchItem(ValueError):
     """
@@ -15,44 +16,49 @@ class ScreenItem(object):
     something that has a line parser
     and is able to locate itself within the lines
     """
+    __slots__ = ()
     parser = lineparser.Parser(mapping = []) # to be overriden in subclasses
 
-    def __init__(self):
-        self.parser = lineparser.Parser(self.mapping)
+    def snapshot(self, lines):
+        """
+        return a snapshot of the lines to look self up in;
+        pass a ScreenSnapshot instead of lines to avoid re-parsing the lines for each lookup
+        """
+        if isinstance(lines, ScreenSnapshot):
+            return lines
+        return ScreenSnapshot(lines, type(self))
 
     def locate(self, lines):
         """
-        locate self in the lines while parsing those
+        locate self in the lines (or a ScreenSnapshot of those)
         raises NoSuchItem
         returns linenr of the first line the item starts on
         """
-        index = 0
-        for index, other in self.iter_parse(lines):
-            if self == other:
-                break
-        else:
+        try:
+            return self.snapshot(lines).item_lines[self]
+        except KeyError:
             raise NoSuchItem("can't locate self in lines given")
-        return index
 
     def selected(self, lines):
         """
         a default implementation of a screen item selection handling
         return True/False, on-screen-index
         """
-        index = self.locate(lines)
+        snapshot = self.snapshot(lines)
+        index = self.locate(snapshot)
         # usually, the "selection"--pattern header will preceed the line
         # on which this item was found; subclasses may override
-        return rhuimanager.RHUIManager.selected_line(lines[index - 1])
+        if self not in snapshot.items:
+            raise rhuimanager.NotSelectLine(snapshot.lines[index - 1])
+        return snapshot.items[self]
 
     @classmethod
     def from_parsed_item_pairs(cls, item_pairs):
         """
         a default implementation of the parser--output constructor
         """
-        obj = cls()
-        for pair in item_pairs:
-            setattr(obj, pair[0], pair[1][0]) # second item is a tuple here (re.match groups)
-        return obj
+        # second item is a tuple here (re.match groups)
+        return cls(**dict([(pair[0], pair[1][0]) for pair in item_pairs]))
 
     @classmethod
     def parse(cls, lines):
@@ -0,0 +1,94 @@
+"""
+Screen snapshot module
+"""
+
+import re
+
+SELECTION_PATTERN = re.compile(r'^\s*(x|-)\s+(\d+)\s*:(.*)$')
+
+class ScreenSnapshot(object):
+    """
+    a multiple choice listing as seen on some rhui screen, parsed once;
+    items can then be looked up by their label or by the parsed item
+    without going through the lines again
+    """
+    def __init__(self, lines, item_class=None):
+        """
+        lines as returned by RHUIManager.list_lines()
+        item_class is an optional ScreenItem subclass to parse the items with
+        """
+        self.lines = lines
+        # (label, selected, on-screen index) tuples in the on-screen order
+        self.entries = []
+        # label -> (selected, on-screen index)
+        self.labels = {}
+        # value of a "Key: value" label -> (selected, on-screen index)
+        self.values = {}
+        # number of a selection line -> (selected, on-screen index)
+        self.selections = {}
+        # parsed item -> number of the line the item starts on
+        self.item_lines = {}
+        # parsed item -> (selected, on-screen index)
+        self.items = {}
+
+        for linenr, line in enumerate(lines):
+            match = SELECTION_PATTERN.match(line)
+            if match is None:
+                continue
+            state = (match.group(1) == 'x', int(match.group(2)))
+            label = match.group(3).strip()
+            if label == "" and linenr + 1 < len(lines):
+                # the label is on the next line in some listings
+                label = lines[linenr + 1].strip()
+            self.entries.append((label, state[0], state[1]))
+            self.labels[label] = state
+            if ":" in label:
+                self.values.setdefault(label.split(":", 1)[1].strip(), state)
+            self.selections[linenr] = state
+
+        if item_class is not None:
+            for linenr, item in item_class.iter_parse(lines):
+                self.item_lines.setdefault(item, linenr)
+                # the selection line usually preceeds the item
+                if linenr - 1 in self.selections:
+                    self.items.setdefault(item, self.selections[linenr - 1])
+
+    def lookup(self, value):
+        """
+        return (selected, on-screen index) of the item with the given label
+        or the given parsed item, None if there's no such item
+        """
+        if hasattr(value, "iter_parse"):
+            return self.items.get(value)
+        if value in self.labels:
+            return self.labels[value]
+        return self.values.get(value)
+
+    def search(self, pattern):
+        """
+        return (selected, on-screen index) of the last item whose label
+        the compiled pattern is found in, None if there's no such item
+        """
+        for label, selected, index in reversed(self.entries):
+            if pattern.search(label):
+                return selected, index
+        return None
+
+    def find(self, text):
+        """
+        return (selected, on-screen index) of the first item whose label
+        contains the given text, None if there's no such item
+        """
+        state = self.lookup(text)
+        if state is not None:
+            return state
+        for label, selected, index in self.entries:
+            if text in label:
+                return selected, index
+        return None
+
+    def selected(self):
+        """
+        return the set of on-screen indexes of the selected items
+        """
+        return set(index for _, selected, index in self.entries if selected)
@@ -0,0 +1,674 @@
+""" A local simulation of rhui-manager for offline development and benchmarking """
+
+import os
+import re
+import socket
+import subprocess
+import time
+
+from rhui3_tests_lib.util import Util
+
+RULE = "-" * 78 + "\r\n"
+SHELL_PROMPT = "[root@rhua ~]# "
+SELECT_PROMPT = "Enter value (1-%s) to toggle selection, 'c' to confirm selections, or '?' for more commands: "
+# screen name -> (title, [(key, description), ...])
+MENUS = {"home": ("Home", [("r", "manage repositories"),
+                           ("c", "manage content delivery servers (CDS)"),
+                           ("l", "manage HAProxy load-balancer instances"),
+                           ("s", "synchronization status and scheduling"),
+                           ("e", "create entitlement certificates and client configuration RPMs"),
+                           ("n", "manage Red Hat entitlement certificates"),
+                           ("sm", "manage Red Hat subscriptions"),
+                           ("u", "manage RHUI users")]),
+         "repo": ("Repository Management", [("l", "list repositories currently managed by the RHUI"),
+                                            ("c", "create a new custom repository (RPM content only)"),
+                                            ("d", "delete a repository from the RHUI"),
+                                            ("u", "upload content into a custom repository")]),
+         "cds": ("CDS Management", [("l", "list all CDS instances registered to the RHUI")]),
+         "loadbalancers": ("Load-balancer Management", [("l", "list all HAProxy Load-balancer instances registered to the RHUI")]),
+         "sync": ("Synchronization Status", [("dr", "display repository synchronization summary"),
+                                             ("sr", "sync an individual repository immediately")])}
+HOME_KEYS = {"r": "repo", "c": "cds", "l": "loadbalancers", "s": "sync"}
+INSTANCE_TITLES = {"cds": "Content Delivery Server (CDS) Instances",
+                   "loadbalancers": "HAProxy Load-balancer Instances"}
+COLUMN_GAP = " " * 13
+# last result -> the color of the result in the output of "rhui-manager status"
+STATUS_COLORS = {"Success": "92", "Error": "91", "Running": "93"}
+
+class SimulatedRHUA(object):
+    '''
+    The state of a simulated RHUA: the repositories, CDS and HAProxy instances,
+    and the settings of the simulation.
+
+    latency is the number of seconds rhui-manager takes to respond to each entered line
+    (the prompt of the response shows up that late), or a function returning that number
+    for the text of the response. A sync requested on the sync screen takes sync_duration
+    seconds. The sync summary is redrawn every refresh seconds.
+    '''
+    def __init__(self, custom_repos=0, redhat_repos=0, cdses=0, loadbalancers=0,
+                 latency=0.0, sync_duration=0.0, refresh=5.0):
+        self.latency = latency
+        self.sync_duration = sync_duration
+        self.refresh = refresh
+        # repository dictionaries sorted by the name, as rhui-manager lists them
+        self.repos = []
+        for number in range(custom_repos):
+            self.add_repo("custom-%05d" % number)
+        for number in range(redhat_repos):
+            self.add_repo("rh-%05d" % number,
+                          Util.format_repo("Red Hat Simulated Product %05d (RPMs)" % number, "7Server-x86_64"),
+                          redhat=True)
+        self.instances = {"cds": ["cds%03d.example.com" % number for number in range(1, cdses + 1)],
+                          "loadbalancers": ["hap%03d.example.com" % number for number in range(1, loadbalancers + 1)]}
+
+    def add_repo(self, repo_id, name=None, redhat=False):
+        '''
+        add a repository
+        '''
+        self.repos.append({"id": repo_id,
+                           "name": name or repo_id,
+                           "redhat": redhat,
+                           "packages": [],
+                           "last_sync": "Never",
+                           "result": "Never",
+                           "sync_started": None})
+        self.repos.sort(key=lambda repo: repo["name"])
+
+    def find_repo(self, repo_id):
+        '''
+        return the repository with the given ID, None if there's no such repository
+        '''
+        return next((repo for repo in self.repos if repo["id"] == repo_id), None)
+
+    def delay(self, text):
+        '''
+        return the number of seconds the response is delayed by
+        '''
+        if callable(self.latency):
+            return self.latency(text)
+        return self.latency
+
+    def sync_status(self, repo):
+        '''
+        return [next sync, last sync, last result] of the repository
+        '''
+        if repo["sync_started"] is not None:
+            if time.time() - repo["sync_started"] < self.sync_duration:
+                return ["In Progress", repo["last_sync"], "Running"]
+            repo["last_sync"] = time.strftime("%m-%d-%Y %H:%M", time.localtime(repo["sync_started"]))
+            repo["result"] = "Success"
+            repo["sync_started"] = None
+        if repo["result"] == "Never":
+            return ["Not Scheduled", repo["last_sync"], "Never"]
+        return [time.strftime("%m-%d-%Y %H:%M", time.localtime(time.time() + 6 * 3600)),
+                repo["last_sync"],
+                repo["result"]]
+
+    def run(self, command):
+        '''
+        run the command, return (exit status, stdout, stderr); the status, repo list,
+        repo info and repo sync commands of the rhui-manager CLI are simulated,
+        anything else exits with 0 and prints nothing
+        '''
+        words = command.split()
+        if words[:2] == ["rhui-manager", "status"]:
+            text = "Repository Sync Status\n"
+            for repo in self.repos:
+                result = self.sync_status(repo)[2]
+                text += "%-80s [ \x1b[%sm%s\x1b[0m ]\n" % (repo["name"], STATUS_COLORS.get(result, "0"), result)
+            return 0, text + "\nEntitlement CA certificate expiration date = 01-01-2038 ........ [ OK ]\n", ""
+        if words[:3] == ["rhui-manager", "repo", "list"]:
+            text = "%-40s :: %s\n" % ("ID", "Repository Name")
+            for repo in self.repos:
+                text += "%-40s :: %s\n" % (repo["id"], repo["name"])
+            return 0, text, ""
+        if words[:3] == ["rhui-manager", "repo", "info"] or words[:3] == ["rhui-manager", "repo", "sync"]:
+            repo = self.find_repo(words[-1])
+            if repo is None:
+                return 1, "", "Repository %s not found\n" % words[-1]
+            if words[2] == "info":
+                return 0, "Name:                %s\nID:                  %s\n" % (repo["name"], repo["id"]), ""
+            repo["sync_started"] = time.time()
+            return 0, "The repository %s has been successfully scheduled for the next available timeslot.\n" % repo["id"], ""
+        return 0, "", ""
+
+class SimulatedChannel(object):
+    '''
+    An interactive shell channel with rhui-manager running in it, as simulated.
+
+    Responses become available after the latency of the simulated RHUA; recv() waits
+    for them up to the channel timeout like a real channel does, and raises socket.timeout
+    if nothing is (or will be) available in time.
+    '''
+    def __init__(self, rhua):
+        self.rhua = rhua
+        self.timeout = 10
+        self.echo = True
+        self.columns = 360
+        # None in the shell, else the current screen name
+        self.screen = None
+        # shell commands to run once rhui-manager exits
+        self.after_exit = []
+        # generator of the dialog in progress, fed with the entered lines
+        self.dialog = None
+        # the time of the next redraw of the sync summary, None if it isn't displayed
+        self.redraw_at = None
+        self.partial = ""
+        # [(time the text becomes available, text), ...]
+        self.pending = []
+        self.pending.append((time.time(), "Last login: simulated\r\n" + SHELL_PROMPT))
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def gettimeout(self):
+        return self.timeout
+
+    def setblocking(self, flag):
+        pass
+
+    def close(self):
+        pass
+
+    def send(self, data):
+        '''
+        type the data; the response to every complete line is queued
+        '''
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+        self.partial += data
+        while "\n" in self.partial:
+            line, self.partial = self.partial.split("\n", 1)
+            echo = line + "\r\n" if self.echo else ""
+            response = self._respond(line)
+            self.pending.append((time.time() + self.rhua.delay(response), echo + response))
+        return len(data)
+
+    def recv(self, nbytes):
+        '''
+        return the available text (up to nbytes characters of it) as bytes
+        '''
+        now = time.time()
+        if self.redraw_at is not None and not self.pending:
+            self.pending.append((self.redraw_at, self._summary()))
+            self.redraw_at += self.rhua.refresh
+        if not self.pending or self.pending[0][0] > now + self.timeout:
+            raise socket.timeout()
+        if self.pending[0][0] > now:
+            time.sleep(self.pending[0][0] - now)
+            now = time.time()
+        text = ""
+        while self.pending and self.pending[0][0] <= now and len(text) < nbytes:
+            text += self.pending.pop(0)[1]
+        if len(text) > nbytes:
+            self.pending.insert(0, (now, text[nbytes:]))
+            text = text[:nbytes]
+        return text.encode("utf-8")
+
+    def kill(self):
+        '''
+        rhui-manager has been killed
+        '''
+        if self.screen is not None:
+            self.dialog = None
+            self.redraw_at = None
+            self.pending.append((time.time(), "\r\n" + self._exit()))
+
+    def _prompt(self):
+        '''
+        (internally used) return the prompt shown at the moment
+        '''
+        if self.screen is None:
+            return SHELL_PROMPT
+        return "rhui (%s) => " % self.screen
+
+    def _menu(self):
+        '''
+        (internally used) return the menu of the current screen and the prompt
+        '''
+        title, entries = MENUS.get(self.screen, (self.screen, []))
+        text = RULE + "             -= Red Hat Update Infrastructure Management Tool =-\r\n\r\n\r\n"
+        text += "-= %s =-\r\n\r\n" % title
+        for key, description in entries:
+            text += "   %-3s %s\r\n" % (key, description)
+        text += "\r\n                                           Connected: rhua.example.com\r\n"
+        return text + RULE + self._prompt()
+
+    def _exit(self):
+        '''
+        (internally used) rhui-manager exits; return the shell prompt
+        '''
+        self.screen = None
+        self.dialog = None
+        self.redraw_at = None
+        for command in self.after_exit:
+            self._shell(command)
+        self.after_exit = []
+        return SHELL_PROMPT
+
+    def _shell(self, command):
+        '''
+        (internally used) run a shell command, return True if it launched rhui-manager
+        '''
+        words = command.split()
+        if not words:
+            return False
+        if words[0] == "stty":
+            for word in words[1:]:
+                if word == "-echo":
+                    self.echo = False
+                elif word == "echo":
+                    self.echo = True
+                elif word.isdigit():
+                    self.columns = int(word)
+            return False
+        if words[-1] == "rhui-manager":
+            self.screen = "home"
+            return True
+        return False
+
+    def _respond(self, line):
+        '''
+        (internally used) return the response to the entered line
+        '''
+        line = line.strip("\r")
+        if self.screen is None:
+            commands = line.split(";")
+            for position, command in enumerate(commands):
+                if self._shell(command.strip()):
+                    self.after_exit = [other.strip() for other in commands[position + 1:]]
+                    return self._menu()
+            return SHELL_PROMPT
+        if self.dialog is not None:
+            if line == "\x03":
+                self.dialog = None
+                self.redraw_at = None
+                return "\r\n" + self._prompt()
+            text, finished = self.dialog.send(line)
+            if finished:
+                self.dialog = None
+            return text
+        if line == "q":
+            return self._exit()
+        if line == "home" or line == "b":
+            self.screen = "home"
+            return self._menu()
+        if self.screen == "home" and line in HOME_KEYS:
+            self.screen = HOME_KEYS[line]
+            return self._menu()
+        dialog = None
+        if self.screen == "repo":
+            if line == "l":
+                return self._repo_listing()
+            if line == "c":
+                dialog = self._create_custom_repo()
+            if line == "d":
+                dialog = self._select_dialog([repo["name"] for repo in self.rhua.repos],
+                                             "The following repositories will be deleted:",
+                                             self._delete_repos)
+            if line == "u":
+                dialog = self._upload_dialog([repo["name"] for repo in self.rhua.repos if not repo["redhat"]])
+        elif self.screen in INSTANCE_TITLES and line == "l":
+            return self._instance_listing()
+        elif self.screen == "sync":
+            if line == "dr":
+                dialog = self._sync_status()
+            if line == "sr":
+                dialog = self._select_dialog([repo["name"] for repo in self.rhua.repos],
+                                             "The following repositories will be scheduled for synchronization:",
+                                             self._sync_repos,
+                                             "Select one or more repositories:\r\n")
+        if dialog is None:
+            return self._prompt()
+        self.dialog = dialog
+        text, _ = next(dialog)
+        return text
+
+    def _repo_listing(self):
+        '''
+        (internally used) return the repo screen listing
+        '''
+        if not self.rhua.repos:
+            return "\r\nNo repositories are currently managed by the RHUI\r\n\r\n" + RULE + self._prompt()
+        text = "\r\n"
+        custom = [repo["name"] for repo in self.rhua.repos if not repo["redhat"]]
+        redhat = [repo["name"] for repo in self.rhua.repos if repo["redhat"]]
+        if custom:
+            text += "Custom Repositories\r\n" + "".join(["  %s\r\n" % name for name in custom]) + "\r\n"
+        if redhat:
+            text += "Red Hat Repositories\r\n" + "".join(["  %s (Yum)\r\n" % name for name in redhat]) + "\r\n"
+        return text + RULE + self._prompt()
+
+    def _instance_listing(self):
+        '''
+        (internally used) return the listing of the CDS or HAProxy instances
+        '''
+        text = "\r\n-= %s =-\r\n\r\n" % INSTANCE_TITLES[self.screen]
+        for host_name in self.rhua.instances[self.screen]:
+            text += "  Hostname:                %s\r\n" % host_name
+            text += "  SSH Username:            ec2-user\r\n"
+            text += "  SSH Private Key:         /root/.ssh/id_rsa_rhua\r\n\r\n"
+        return text + RULE + self._prompt()
+
+    def _sync_status(self):
+        '''
+        (internally used) the dialog of the synchronization summary, redrawn as recv()
+        is called, left with ctrl+c
+        '''
+        self.redraw_at = time.time() + self.rhua.refresh
+        yield self._summary(), False
+        while True:
+            # everything but ctrl+c (handled in _respond) is ignored
+            yield "", False
+
+    def _summary(self):
+        '''
+        (internally used) return one drawing of the synchronization summary
+        '''
+        text = "\r\nLast Refreshed: %s\r\n" % time.strftime("%H:%M:%S")
+        text += "(updated every %g seconds, ctrl+c to exit)\r\n\r\n" % self.rhua.refresh
+        text += "Next Sync" + COLUMN_GAP + "Last Sync" + COLUMN_GAP + "Last Result\r\n" + RULE
+        for repo in self.rhua.repos:
+            text += repo["name"] + "\r\n" + COLUMN_GAP.join(self.rhua.sync_status(repo)) + "\r\n\r\n"
+        return text + "\r\n"
+
+    def _select_dialog(self, labels, caption, action, header=""):
+        '''
+        (internally used) the dialog of a multiple choice selection
+        followed by the confirmation of the selected items;
+        action is called with the selected labels if confirmed
+        '''
+        selected = set()
+        line = yield header + self._selection(labels, selected), False
+        while line != "c":
+            self._toggle(labels, selected, line)
+            line = yield self._selection(labels, selected), False
+        chosen = [labels[index] for index in sorted(selected)]
+        answer = yield caption + "\r\n" + "".join(["  %s\r\n" % label for label in chosen]) + \
+                       "Proceed? (y/n) ", False
+        if answer == "y":
+            text = action(chosen)
+        else:
+            text = ""
+        yield text + "\r\n" + self._prompt(), True
+
+    @staticmethod
+    def _selection(labels, selected):
+        '''
+        (internally used) return the listing of a multiple choice selection
+        '''
+        text = ""
+        for index, label in enumerate(labels):
+            text += "  %s  %s : %s\r\n" % ("x" if index in selected else "-", index + 1, label)
+        return text + SELECT_PROMPT % len(labels)
+
+    @staticmethod
+    def _toggle(labels, selected, line):
+        '''
+        (internally used) update the selected indexes according to the entered line
+        '''
+        if line.isdigit() and 0 < int(line) <= len(labels):
+            selected.symmetric_difference_update([int(line) - 1])
+        elif line == "a":
+            selected.update(range(len(labels)))
+
+    def _upload_dialog(self, labels):
+        '''
+        (internally used) the dialog of the content upload: the selection of the custom
+        repositories, then the path of an RPM file or of a directory with RPM files (read
+        from the local file system, following symbolic links), then the confirmation
+        '''
+        selected = set()
+        line = yield self._selection(labels, selected), False
+        while line != "c":
+            self._toggle(labels, selected, line)
+            line = yield self._selection(labels, selected), False
+        path = yield "Location of an .rpm file or directory containing .rpm files that will be uploaded: ", False
+        if os.path.isdir(path):
+            files = sorted([name for name in os.listdir(path)
+                            if name.endswith(".rpm") and os.path.isfile(os.path.join(path, name))])
+        elif os.path.isfile(path):
+            files = [os.path.basename(path)]
+        else:
+            files = []
+        answer = yield "The following RPMs will be uploaded:\r\n" + \
+                       "".join(["  %s\r\n" % name for name in files]) + "Proceed? (y/n) ", False
+        text = ""
+        if answer == "y":
+            for repo in self.rhua.repos:
+                if repo["name"] in [labels[index] for index in selected]:
+                    repo["packages"].extend(files)
+            text = "".join(["Successfully uploaded %s\r\n" % name for name in files])
+        yield text + "\r\n" + self._prompt(), True
+
+    def _delete_repos(self, names):
+        '''
+        (internally used) delete the repositories with the given names
+        '''
+        self.rhua.repos = [repo for repo in self.rhua.repos if repo["name"] not in names]
+        return "".join(["Deleted %s\r\n" % name for name in names])
+
+    def _sync_repos(self, names):
+        '''
+        (internally used) start syncing the repositories with the given names
+        '''
+        for repo in self.rhua.repos:
+            if repo["name"] in names:
+                repo["sync_started"] = time.time()
+        return "\r\n%s repositories scheduled for synchronization\r\n" % len(names)
+
+    def _create_custom_repo(self):
+        '''
+        (internally used) the dialog of the custom repository creation
+        '''
+        repo_id = yield "Unique ID for the custom repository (alphanumerics, _, and - only): ", False
+        while self.rhua.find_repo(repo_id) is not None or not re.match("^[A-Za-z0-9_-]+$", repo_id):
+            repo_id = yield "A repository with ID \"%s\" already exists\r\n" % repo_id + \
+                            "Unique ID for the custom repository (alphanumerics, _, and - only): ", False
+        name = (yield "Display name for the custom repository [%s]: " % repo_id, False) or repo_id
+        path = (yield "Unique path at which the repository will be served [%s]: " % repo_id, False) or repo_id
+        summary = ["ID: " + repo_id, "Name: " + name, "Path: " + path]
+        yield "Enter the checksum type to be used for the repository metadata:\r\n" + \
+              "  1 - sha256\r\n  2 - sha1\r\nEnter value (1-2) or 'b' to abort: ", False
+        answer = yield "Should the repository require an entitlement certificate to access? (y/n) ", False
+        if answer == "y":
+            guess, count = re.subn("(i386|x86_64)", "$basearch", path)
+            if count > 1:
+                guess = path
+            entitlement = (yield "Path that should be used when granting an entitlement for this repository [%s]: " % \
+                                 guess, False) or guess
+            summary.append("Entitlement: " + entitlement)
+        answer = yield "Should the repository require clients to perform a GPG check and verify " + \
+                       "packages are signed by a GPG key? (y/n) ", False
+        if answer == "y":
+            summary.append("GPG Check Yes")
+            answer = yield "Will the repository be used to host any Red Hat GPG signed content? (y/n) ", False
+            summary.append("Red Hat GPG Key: " + ("Yes" if answer == "y" else "No"))
+            answer = yield "Will the repository be used to host any custom GPG signed content? (y/n) ", False
+            keys = []
+            while answer == "y":
+                keys.append((yield "Enter the absolute path to the public key of the GPG keypair: ", False))
+                answer = yield "Would you like to enter another public key? (y/n) ", False
+            summary.append("Custom GPG Keys: " + (", ".join(["'%s'" % key for key in keys]) or "(None)"))
+        else:
+            summary.append("GPG Check No")
+            summary.append("Red Hat GPG Key: No")
+        answer = yield "The following repository will be created:\r\n" + \
+                       "".join(["  %s\r\n" % item for item in summary]) + "Proceed? (y/n) ", False
+        text = ""
+        if answer == "y":
+            self.rhua.add_repo(repo_id, name)
+            text = "Successfully created repository \"%s\"\r\n" % name
+        yield text + "\r\n" + self._prompt(), True
+
+class SimulatedClient(object):
+    '''
+    The replacement of the paramiko client of a simulated connection.
+    '''
+    def __init__(self, connection):
+        self.connection = connection
+
+    def exec_command(self, command, *args, **kwargs):
+        '''
+        run the command; only killing rhui-manager has an effect
+        '''
+        if command.startswith("killall") and command.endswith("rhui-manager"):
+            self.connection.channel.kill()
+        return None, None, None
+
+    def get_transport(self):
+        '''
+        return the transport for opening exec channels
+        '''
+        return SimulatedTransport(self.connection.rhua)
+
+class SimulatedTransport(object):
+    '''
+    The replacement of the paramiko transport of a simulated connection.
+    '''
+    def __init__(self, rhua):
+        self.rhua = rhua
+
+    def open_session(self):
+        '''
+        return a new exec channel
+        '''
+        return SimulatedExecChannel(self.rhua)
+
+class SimulatedExecChannel(object):
+    '''
+    An exec channel running a command on the simulated RHUA (see SimulatedRHUA.run).
+    '''
+    def __init__(self, rhua):
+        self.rhua = rhua
+        self.status = -1
+        self.stdout = b""
+        self.stderr = b""
+
+    def settimeout(self, timeout):
+        pass
+
+    def exec_command(self, command):
+        '''
+        run the command; the output is available after the latency
+        a script of several lines is run by the local shell, with every line starting with
+        a rhui-manager command (possibly after "{ ") replaced by the simulated command
+        '''
+        if "\n" in command:
+            self.status, stdout, stderr = self._script(command)
+        else:
+            self.status, stdout, stderr = self.rhua.run(command)
+        time.sleep(self.rhua.delay(stdout))
+        self.stdout = stdout.encode("utf-8")
+        self.stderr = stderr.encode("utf-8")
+
+    def _script(self, script):
+        '''
+        (internally used) run the script, return (exit status, stdout, stderr)
+        '''
+        def quote(text):
+            '''quote the text for the shell'''
+            return "'" + text.replace("'", "'\\''") + "'"
+        lines = []
+        for line in script.split("\n"):
+            prefix = "{ " if line.startswith("{ ") else ""
+            if line[len(prefix):].startswith("rhui-manager "):
+                status, stdout, stderr = self.rhua.run(line[len(prefix):])
+                line = "%sprintf %%s %s; printf %%s %s >&2; (exit %s)" % (prefix, quote(stdout), quote(stderr), status)
+            lines.append(line)
+        process = subprocess.Popen(["/bin/sh", "-c", "\n".join(lines)],
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = process.communicate()
+        return process.returncode, stdout.decode("utf-8"), stderr.decode("utf-8")
+
+    def recv(self, size):
+        data, self.stdout = self.stdout[:size], self.stdout[size:]
+        return data
+
+    def recv_stderr_ready(self):
+        return len(self.stderr) > 0
+
+    def recv_stderr(self, size):
+        data, self.stderr = self.stderr[:size], self.stderr[size:]
+        return data
+
+    def exit_status_ready(self):
+        return True
+
+    def recv_exit_status(self):
+        return self.status
+
+    def close(self):
+        pass
+
+class SimulatedFileAttributes(object):
+    '''
+    The attributes of a file as returned by SimulatedSFTP.
+    '''
+    def __init__(self, filename, result):
+        self.filename = filename
+        self.st_mode = result.st_mode
+        self.st_size = result.st_size
+
+class SimulatedSFTP(object):
+    '''
+    The replacement of the paramiko SFTP client of a simulated connection; the files
+    of the simulated RHUA are the local ones.
+    '''
+    def stat(self, path):
+        try:
+            return SimulatedFileAttributes(os.path.basename(path), os.stat(path))
+        except OSError as error:
+            raise IOError(str(error))
+
+    def listdir_attr(self, path):
+        return [SimulatedFileAttributes(name, os.lstat(os.path.join(path, name))) for name in os.listdir(path)]
+
+    def mkdir(self, path):
+        os.mkdir(path)
+
+    def symlink(self, source, dest):
+        os.symlink(source, dest)
+
+    def remove(self, path):
+        os.remove(path)
+
+    def rmdir(self, path):
+        os.rmdir(path)
+
+class SimulatedConnection(object):
+    '''
+    A connection to a simulated RHUA; it can be used with Expect and the RHUIManager*
+    classes in place of a stitches connection, with no RHUA:
+
+        connection = SimulatedConnection(SimulatedRHUA(custom_repos=1000, latency=0.05))
+        RHUIManagerRepo.list(connection)
+
+    The shell channel simulates the home, repo, cds, loadbalancers and sync screens of
+    rhui-manager: the listings, the custom repository creation, the repository deletion,
+    the content upload, the synchronization summary and the sync requests. Commands run
+    over exec channels opened on the transport simulate a few rhui-manager CLI commands
+    (see SimulatedRHUA.run); the other commands exit with 0 and print nothing. The SFTP
+    client works with the local files.
+    '''
+    def __init__(self, rhua=None, username="root"):
+        self.rhua = rhua if rhua is not None else SimulatedRHUA()
+        self.username = username
+        self.output_shell = False
+        self.channel = SimulatedChannel(self.rhua)
+        self.cli = SimulatedClient(self)
+        self.sftp = SimulatedSFTP()
+        self.last_command = None
+        self.last_stdout = b""
+        self.last_stderr = b""
+
+    def recv_exit_status(self, command, timeout=10, get_pty=False):
+        '''
+        "run" the command
+        '''
+        self.last_command = command
+        self.cli.exec_command(command)
+        return 0
+
+    def disconnect(self):
+        pass
@@ -0,0 +1,206 @@
+""" Parsing of the repository synchronization summary """
+
+import codecs
+import logging
+import re
+import socket
+import sys
+import time
+
+from stitches.expect import ExpectFailed
+from rhui3_tests_lib.channelfilter import AnsiFilter
+from rhui3_tests_lib.records import SyncStatus
+
+# column titles in the header of the summary -> SyncStatus fields
+COLUMN_TITLES = [("Next Sync", "next_sync"),
+                 ("Last Sync", "last_sync"),
+                 ("Last Result", "result")]
+# the lines above the header of every redraw
+REDRAW_TITLES = ["Last Refreshed", "(updated every"]
+# the values are separated by at least two spaces ("In Progress" contains one)
+VALUE_SEPARATOR = re.compile(r'\s{2,}')
+
+class SyncStatusTable(object):
+    '''
+    The synchronization summary (the "dr" command on the sync screen), parsed as it arrives.
+
+    The header of the summary determines where the columns start; each repository
+    is listed as its name on one line and the column values on the next line. A line
+    that doesn't reach the last column is the rest of a name wrapped over several lines.
+    The lines are parsed once, as soon as they are complete; the summary is redrawn
+    every few seconds, and every header starts the table anew, so the statuses are
+    always those of the latest redraw. The lines above the header of a redraw are skipped.
+    '''
+    def __init__(self):
+        # [(offset, SyncStatus field), ...] in the on-screen order, None until the header is read
+        self.columns = None
+        # repository name -> SyncStatus
+        self.statuses = {}
+        # repository names in the on-screen order
+        self.names = []
+        # repository names of the latest complete redraw, None until a redraw is complete
+        self.listed = None
+        self.redraws = 0
+        self._name = None
+        self._partial = ""
+
+    def feed(self, text):
+        '''
+        parse the text that has arrived
+        '''
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._line(line.rstrip("\r"))
+
+    def _line(self, line):
+        '''
+        (internally used) parse a complete line
+        '''
+        if "\x1b" in line:
+            line = AnsiFilter.strip(line)
+        columns = self._header(line)
+        if columns is not None:
+            self._complete()
+            self.columns = columns
+            self.statuses = {}
+            self.names = []
+            self._name = None
+            self.redraws += 1
+            return
+        for title in REDRAW_TITLES:
+            if title in line:
+                # a redraw begins; nothing is a row until its header
+                self._complete()
+                self.columns = None
+                self._name = None
+                return
+        stripped = line.strip()
+        if self.columns is None or stripped == "" or stripped.strip("-") == "":
+            return
+        if self._name is None:
+            self._name = stripped
+            return
+        if len(line.rstrip()) <= self.columns[-1][0]:
+            # the name goes on; the words of a wrapped name are separated by a space
+            self._name += " " + stripped
+            return
+        values = self._split(line)
+        values["repo"] = self._name
+        self.statuses[self._name] = SyncStatus(**values)
+        self.names.append(self._name)
+        self._name = None
+
+    def _complete(self):
+        '''
+        (internally used) remember the names listed in the table being read, if any,
+        as a redraw or a header ends it
+        '''
+        if self.columns is not None:
+            self.listed = list(self.names)
+
+    @staticmethod
+    def _header(line):
+        '''
+        (internally used) return the columns if the line is the header, otherwise None
+        '''
+        columns = []
+        for title, field in COLUMN_TITLES:
+            offset = line.find(title)
+            if offset == -1:
+                return None
+            columns.append((offset, field))
+        return sorted(columns)
+
+    def _split(self, line):
+        '''
+        (internally used) return {field: value} of a line with the column values
+        '''
+        offsets = [offset for offset, _ in self.columns] + [len(line)]
+        values = {}
+        for position, (offset, field) in enumerate(self.columns):
+            end = offsets[position + 1]
+            if 0 < end < len(line) and line[end - 1] != " " and line[end] != " ":
+                # a value overflowing its column; fall back on the separators
+                parts = VALUE_SEPARATOR.split(line.strip())
+                if len(parts) == len(self.columns):
+                    return dict(zip([field for _, field in self.columns], parts))
+            values[field] = line[offset:end].strip()
+        return values
+
+    def find(self, repo):
+        '''
+        return the status of the repository, None if it isn't listed (yet);
+        the name must be the whole name listed on the screen
+        '''
+        return self.statuses.get(repo)
+
+    def status(self, repo):
+        '''
+        return the status of the repository
+        raises ExpectFailed if it isn't listed
+        '''
+        status = self.find(repo)
+        if status is None:
+            raise ExpectFailed("Sync status of %s not found" % repo)
+        return status
+
+    def has_all(self, repolist):
+        '''
+        return True if the statuses of all the repositories have been read
+        '''
+        for repo in repolist:
+            if self.find(repo) is None:
+                return False
+        return True
+
+    def records(self):
+        '''
+        return the list of the statuses in the on-screen order
+        '''
+        return [self.statuses[name] for name in self.names]
+
+    def read(self, connection, repolist=None, settle=2, timeout=60):
+        '''
+        read the summary from the shell channel of the connection
+        if repolist is set, stop as soon as the statuses of those repositories have been read,
+        otherwise stop when nothing has arrived for settle seconds after a complete table
+        timeout is the number of seconds to wait for more text
+        raises ExpectFailed if the summary doesn't show up in time, or if a repository
+        isn't listed in a complete redraw
+        '''
+        channel = connection.channel
+        decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        deadline = time.time() + timeout
+        quiet_since = time.time()
+        channel_timeout = channel.gettimeout()
+        try:
+            while True:
+                now = time.time()
+                if repolist and self.has_all(repolist):
+                    return
+                if repolist and self.listed is not None:
+                    missing = [repo for repo in repolist if repo not in self.listed]
+                    if missing:
+                        raise ExpectFailed("Sync status of %s not found" % ", ".join(missing))
+                if not repolist and self.names and self._name is None and now - quiet_since >= settle:
+                    return
+                if now >= deadline:
+                    missing = [repo for repo in repolist or [] if self.find(repo) is None]
+                    raise ExpectFailed("Sync status of %s not found" % (", ".join(missing) or "the repositories"))
+                channel.settimeout(min(deadline - now, 1.0))
+                try:
+                    data = channel.recv(131072)
+                except socket.timeout:
+                    continue
+                if not data:
+                    raise ExpectFailed("Channel closed while reading the sync status")
+                text = decoder.decode(data)
+                logging.getLogger('stitches.expect').debug("RCV: " + text)
+                if getattr(connection, "output_shell", False):
+                    sys.stdout.write(text)
+                self.feed(text)
+                quiet_since = deadline = time.time()
+                deadline += timeout
+        finally:
+            channel.settimeout(channel_timeout)
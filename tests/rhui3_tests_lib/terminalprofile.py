@@ -0,0 +1,43 @@
+""" Terminal settings for rhui-manager sessions """
+
+class TerminalProfile(object):
+    '''
+    Terminal settings applied in the shell when rhui-manager is launched.
+
+    The settings are part of the launch command line, so they cost no extra round trip:
+    - a very wide terminal, so that long repo names don't wrap and break the listings,
+    - no pager, so that nothing stops to wait for a key press,
+    - optionally no echo of the entered input, so that the screens don't contain
+      the commands and the listings are shorter; the echo is turned back on as soon as
+      rhui-manager exits, so that the commands run in the shell afterwards see the
+      terminal as usual.
+    '''
+    def __init__(self, columns=1000, echo=False, pager="cat"):
+        self.columns = columns
+        self.echo = echo
+        self.pager = pager
+
+    def launch_command(self, command="rhui-manager"):
+        '''
+        return the shell command line launching the given command with this profile
+        '''
+        parts = []
+        settings = []
+        if self.columns:
+            settings.append("cols %s" % self.columns)
+        if not self.echo:
+            settings.append("-echo")
+        if settings:
+            parts.append("stty " + " ".join(settings))
+        if self.pager is not None:
+            command = "PAGER=%s %s" % (self.pager, command)
+        parts.append(command)
+        if not self.echo:
+            parts.append("stty echo")
+        return "; ".join(parts)
+
+    def __repr__(self):
+        return "TerminalProfile(columns=%s, echo=%s, pager=%s)" % (self.columns, self.echo, self.pager)
+
+# the profile rhui-manager sessions use by default
+QUIET_PROFILE = TerminalProfile()
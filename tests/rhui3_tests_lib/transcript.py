@@ -0,0 +1,301 @@
+""" Recording and replaying of the conversations with RHUA """
+
+import io
+import json
+import time
+
+from stitches.expect import ExpectFailed
+from rhui3_tests_lib.channelfilter import FilteredChannel
+
+class ReplayMismatch(ExpectFailed):
+    """
+    To be raised when the code being replayed does something else than the recorded code
+    """
+
+def _text(data):
+    '''
+    (internally used) return the bytes as text that can be stored in JSON losslessly
+    '''
+    if isinstance(data, bytes):
+        return data.decode("latin-1")
+    return data
+
+def _bytes(text):
+    '''
+    (internally used) the opposite of _text()
+    '''
+    return text.encode("latin-1")
+
+class Transcript(object):
+    '''
+    A record of everything sent to and received from a connection, with timings.
+
+    Events are dictionaries with the time (in seconds since the recording started),
+    the kind of the event, and the data:
+    - "send": the text typed into the shell channel,
+    - "recv": the bytes received from the shell channel, exactly as received
+      (escape sequences included),
+    - "status": the command run with recv_exit_status, its exit status, stdout and stderr,
+    - "exec": the command run with cli.exec_command (other than by recv_exit_status,
+      which is recorded as a whole as the "status" event).
+
+    Start recording with Transcript.record(connection), stop with transcript.stop(),
+    save the events with transcript.save(path); a connection for the replay is then
+    created with ReplayConnection(Transcript.load(path)).
+    '''
+    def __init__(self, events=None):
+        self.events = events if events is not None else []
+        self.start = time.time()
+        self.connection = None
+
+    def add(self, kind, **data):
+        '''
+        add an event happening now
+        '''
+        data["time"] = time.time() - self.start
+        data["event"] = kind
+        self.events.append(data)
+
+    @staticmethod
+    def record(connection):
+        '''
+        start recording the conversation with the connection, return the transcript
+        '''
+        transcript = Transcript()
+        transcript.connection = connection
+        channel = connection.channel
+        if isinstance(channel, FilteredChannel):
+            # record what the filter gets
+            channel.channel = RecordingChannel(channel.channel, transcript)
+        else:
+            channel = RecordingChannel(channel, transcript)
+            try:
+                connection.channel = channel
+            except AttributeError:
+                # the channel is a lazy property of stitches connections, cached in _lazy_channel
+                connection._lazy_channel = channel
+        recv_exit_status = connection.recv_exit_status
+        # the depth of recv_exit_status calls, which run the command with cli.exec_command
+        nested = []
+        def recording_recv_exit_status(command, *args, **kwargs):
+            nested.append(command)
+            try:
+                status = recv_exit_status(command, *args, **kwargs)
+            finally:
+                nested.pop()
+            transcript.add("status", command=command, status=status,
+                           stdout=_text(getattr(connection, "last_stdout", b"") or b""),
+                           stderr=_text(getattr(connection, "last_stderr", b"") or b""))
+            return status
+        connection.recv_exit_status = recording_recv_exit_status
+        cli = connection.cli
+        exec_command = cli.exec_command
+        def recording_exec_command(command, *args, **kwargs):
+            if not nested:
+                transcript.add("exec", command=command)
+            return exec_command(command, *args, **kwargs)
+        cli.exec_command = recording_exec_command
+        return transcript
+
+    def stop(self):
+        '''
+        stop recording, leave the connection as it was
+        '''
+        connection = self.connection
+        if connection is None:
+            return
+        channel = connection.channel
+        if isinstance(channel, FilteredChannel):
+            if isinstance(channel.channel, RecordingChannel):
+                channel.channel = channel.channel.channel
+        elif isinstance(channel, RecordingChannel):
+            try:
+                connection.channel = channel.channel
+            except AttributeError:
+                connection._lazy_channel = channel.channel
+        del connection.recv_exit_status
+        del connection.cli.exec_command
+        self.connection = None
+
+    def save(self, path):
+        '''
+        write the events to the file, one JSON object per line
+        '''
+        with open(path, "w") as output:
+            for event in self.events:
+                output.write(json.dumps(event, sort_keys=True) + "\n")
+
+    @staticmethod
+    def load(path):
+        '''
+        return the transcript saved in the file
+        '''
+        with open(path) as source:
+            return Transcript([json.loads(line) for line in source if line.strip()])
+
+class RecordingChannel(object):
+    '''
+    A wrapper of a shell channel adding everything sent and received to a transcript.
+    Everything else is delegated to the wrapped channel.
+    '''
+    def __init__(self, channel, transcript):
+        self.channel = channel
+        self.transcript = transcript
+
+    def send(self, data):
+        '''
+        send the data, record it
+        '''
+        self.transcript.add("send", data=_text(data))
+        return self.channel.send(data)
+
+    def recv(self, nbytes):
+        '''
+        receive data, record it
+        '''
+        data = self.channel.recv(nbytes)
+        self.transcript.add("recv", data=_text(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self.channel, name)
+
+class ReplayChannel(object):
+    '''
+    A shell channel playing a transcript back.
+
+    Whatever was received after a send is available as soon as the same text is sent again.
+    A send that doesn't match the transcript raises ReplayMismatch. So does a recv when
+    there's nothing more to receive before the next send: the recorded code must have
+    given up waiting at this point, and since ReplayMismatch is an ExpectFailed, the code
+    being replayed takes the same path at once instead of timing out again.
+    If speed is set, the recorded delays are reproduced, divided by speed.
+    '''
+    def __init__(self, transcript, speed=None):
+        self.events = [event for event in transcript.events if event["event"] in ["send", "recv"]]
+        self.position = 0
+        self.speed = speed
+        self.timeout = 10
+        self.last_time = 0.0
+
+    def _wait(self, event):
+        '''
+        (internally used) reproduce the delay before the event if requested
+        '''
+        if self.speed:
+            delay = (event["time"] - self.last_time) / self.speed
+            if delay > 0:
+                time.sleep(delay)
+        self.last_time = event["time"]
+
+    def send(self, data):
+        '''
+        check that the data is what the transcript continues with
+        '''
+        data = _text(data)
+        expected = ""
+        while self.position < len(self.events) and len(expected) < len(data):
+            event = self.events[self.position]
+            if event["event"] == "recv":
+                # received in the recording, but not read by the code being replayed
+                self.position += 1
+                continue
+            expected += event["data"]
+            self.last_time = event["time"]
+            self.position += 1
+        if expected != data:
+            raise ReplayMismatch("Sent %r, the transcript has %r" % (data, expected))
+        return len(data)
+
+    def recv(self, nbytes):
+        '''
+        return the data received before the next send in the transcript
+        '''
+        chunks = []
+        length = 0
+        while self.position < len(self.events) and self.events[self.position]["event"] == "recv":
+            event = self.events[self.position]
+            if length and length + len(event["data"]) > nbytes:
+                break
+            self._wait(event)
+            chunks.append(event["data"])
+            length += len(event["data"])
+            self.position += 1
+        if not chunks:
+            raise ReplayMismatch("Waiting for output after the end of the transcript" if self.finished() \
+                                 else "Waiting for output, the transcript continues with %r" % \
+                                      self.events[self.position]["data"])
+        return _bytes("".join(chunks))
+
+    def finished(self):
+        '''
+        return True if the whole transcript has been played back
+        '''
+        return self.position >= len(self.events)
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def gettimeout(self):
+        return self.timeout
+
+    def setblocking(self, flag):
+        pass
+
+    def close(self):
+        pass
+
+class ReplayClient(object):
+    '''
+    The replacement of the paramiko client of a connection playing a transcript back.
+    '''
+    def __init__(self, connection):
+        self.connection = connection
+
+    def exec_command(self, command, *args, **kwargs):
+        '''
+        check that the command is the next one in the transcript, return empty streams
+        '''
+        self.connection.next_event("exec", command)
+        return io.BytesIO(), io.BytesIO(), io.BytesIO()
+
+class ReplayConnection(object):
+    '''
+    A connection playing a transcript back; it can be used with Expect and the RHUIManager*
+    classes in place of a stitches connection, with no RHUA, at full speed (unless the speed
+    of the replay is set).
+    '''
+    def __init__(self, transcript, username="root", speed=None):
+        self.username = username
+        self.output_shell = False
+        self.channel = ReplayChannel(transcript, speed)
+        self.cli = ReplayClient(self)
+        self.commands = [event for event in transcript.events if event["event"] in ["status", "exec"]]
+        self.last_command = None
+        self.last_stdout = b""
+        self.last_stderr = b""
+
+    def next_event(self, kind, command):
+        '''
+        return the next command event from the transcript, which must be the given one
+        '''
+        if not self.commands:
+            raise ReplayMismatch("Ran %r (%s) after the end of the transcript" % (command, kind))
+        event = self.commands.pop(0)
+        if event["event"] != kind or event["command"] != command:
+            raise ReplayMismatch("Ran %r (%s), the transcript has %r (%s)" % \
+                                 (command, kind, event["command"], event["event"]))
+        return event
+
+    def recv_exit_status(self, command, timeout=10, get_pty=False):
+        '''
+        return the recorded exit status of the command
+        '''
+        event = self.next_event("status", command)
+        self.last_command = command
+        self.last_stdout = _bytes(event["stdout"])
+        self.last_stderr = _bytes(event["stderr"])
+        return event["status"]
+
+    def disconnect(self):
+        pass
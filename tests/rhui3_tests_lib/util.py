@@ -9,6 +9,7 @@ import string
 import yaml
 
 from stitches.expect import Expect, ExpectFailed
+from rhui3_tests_lib.channelfilter import AnsiFilter
 
 
 class Util(object):
@@ -17,13 +18,13 @@ class Util(object):
     '''
     @staticmethod
     def uncolorify(instr):
-        """ Remove colorification """
-        res = instr.replace("\x1b", "")
-        res = res.replace("[91m", "")
-        res = res.replace("[92m", "")
-        res = res.replace("[93m", "")
-        res = res.replace("[0m", "")
-        return res
+        """
+        Remove colorification
+
+        Output read over the shell channel of a rhui-manager session is clean already
+        (see FilteredChannel); this is for output read otherwise, e.g. over exec channels.
+        """
+        return AnsiFilter.strip(instr)
 
     @staticmethod
     def generate_gpg_key(connection, keytype="DSA", keysize="1024", keyvalid="0", realname="Key Owner", email="kowner@example.com", comment="comment"):
@@ -0,0 +1,89 @@
+""" Waiting for conditions with backoff, a deadline and statistics """
+
+import logging
+import random
+import time
+
+from stitches.expect import ExpectFailed
+
+class WaitTimeout(ExpectFailed):
+    '''
+    The condition hasn't been met before the deadline.
+    '''
+    pass
+
+class WaitCancelled(ExpectFailed):
+    '''
+    The wait has been cancelled by the cancellation hook.
+    '''
+    pass
+
+class Waiter(object):
+    '''
+    Check a condition until it's met, sleeping longer and longer between the checks.
+
+    The first check is done right away; the delay then starts at first seconds and grows
+    by the factor up to maximum seconds, each delay randomly shortened or lengthened by up to
+    the jitter fraction so that concurrent waits don't check in lockstep. No sleep goes past
+    the deadline (timeout seconds after the start of the wait, or no deadline if timeout
+    is None). If set, the cancel function is called before every sleep and the wait stops
+    as soon as it returns True. The statistics of the latest wait are kept in the waiter.
+    '''
+    def __init__(self, first=1, maximum=30, factor=2, jitter=0.1, timeout=None, cancel=None, name="condition"):
+        self.first = first
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.timeout = timeout
+        self.cancel = cancel
+        self.name = name
+        self.checks = 0
+        self.slept = 0.0
+        self.elapsed = 0.0
+
+    def delays(self):
+        '''
+        generate the delays between the checks, without the jitter
+        '''
+        delay = self.first
+        while True:
+            yield delay
+            delay = min(delay * self.factor, self.maximum)
+
+    def until(self, condition, *args):
+        '''
+        call condition(*args) until it returns a true value, return that value
+        raises WaitTimeout if the deadline passes, WaitCancelled if the wait is cancelled
+        '''
+        self.checks = 0
+        self.slept = 0.0
+        start = time.time()
+        delays = self.delays()
+        try:
+            while True:
+                self.checks += 1
+                result = condition(*args)
+                if result:
+                    return result
+                if self.cancel is not None and self.cancel():
+                    raise WaitCancelled("Waiting for %s cancelled" % self.name)
+                delay = next(delays)
+                delay *= 1 + random.uniform(-self.jitter, self.jitter)
+                if self.timeout is not None:
+                    remaining = start + self.timeout - time.time()
+                    if remaining <= 0:
+                        raise WaitTimeout("Waiting for %s timed out after %s seconds" % (self.name, self.timeout))
+                    delay = min(delay, remaining)
+                time.sleep(delay)
+                self.slept += delay
+        finally:
+            self.elapsed = time.time() - start
+            logging.debug("Waiting for %s: %s" % (self.name, self.stats()))
+
+    def stats(self):
+        '''
+        return a dictionary with the statistics of the latest wait
+        '''
+        return {"checks": self.checks,
+                "slept": round(self.slept, 3),
+                "elapsed": round(self.elapsed, 3)}
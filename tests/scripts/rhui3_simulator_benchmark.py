@@ -0,0 +1,66 @@
+#! /usr/bin/python -tt
+
+""" Measure how the rhui-manager driving code scales, using the simulated rhui-manager """
+
+import argparse
+import logging
+import os
+import time
+
+from rhui3_tests_lib.rhuimanager import RHUIManager
+from rhui3_tests_lib.rhuimanager_instance import RHUIManagerInstance
+from rhui3_tests_lib.rhuimanager_repo import RHUIManagerRepo
+from rhui3_tests_lib.rhuimanager_sync import RHUIManagerSync
+from rhui3_tests_lib.simulator import SimulatedConnection, SimulatedRHUA
+
+argparser = argparse.ArgumentParser(description='Benchmark the RHUIManager* classes against a simulated RHUA')
+argparser.add_argument('--repos', help='comma-separated numbers of repositories to try', default="10,100,1000")
+argparser.add_argument('--cdses', help='comma-separated numbers of CDSes to try', default="1,10,100")
+argparser.add_argument('--latency', help='comma-separated per-prompt latencies (in seconds) to try', default="0,0.05")
+argparser.add_argument('--rounds', help='number of times to run each operation', type=int, default=3)
+argparser.add_argument('--debug', help='debug mode', action='store_const', const=True, default=False)
+args = argparser.parse_args()
+
+if args.debug:
+    logging.basicConfig(level=logging.DEBUG)
+else:
+    logging.basicConfig(level=logging.WARNING)
+
+def cpu_time():
+    '''
+    return the user + system CPU time of this process
+    '''
+    times = os.times()
+    return times[0] + times[1]
+
+def measure(operation, *opargs):
+    '''
+    return the average numbers of wall clock and CPU seconds the operation takes
+    '''
+    start = time.time()
+    start_cpu = cpu_time()
+    for _ in range(args.rounds):
+        operation(*opargs)
+    return (time.time() - start) / args.rounds, (cpu_time() - start_cpu) / args.rounds
+
+def last_repo_status(connection):
+    '''
+    get the sync status of the last repository listed on the sync screen
+    '''
+    return RHUIManagerSync.get_repo_status(connection, connection.rhua.repos[-1]["name"])
+
+print("%-10s %8s %8s %12s %12s %12s" % ("operation", "items", "latency", "seconds", "CPU seconds", "ms per item"))
+for latency in [float(value) for value in args.latency.split(",")]:
+    cases = []
+    for count in [int(value) for value in args.repos.split(",")]:
+        cases.append(("repo list", count, SimulatedRHUA(custom_repos=count, latency=latency), RHUIManagerRepo.list, ()))
+        cases.append(("repo sync", count, SimulatedRHUA(redhat_repos=count, latency=latency), last_repo_status, ()))
+    for count in [int(value) for value in args.cdses.split(",")]:
+        cases.append(("cds list", count, SimulatedRHUA(cdses=count, latency=latency), RHUIManagerInstance.list, ("cds",)))
+    for name, count, rhua, operation, opargs in cases:
+        connection = SimulatedConnection(rhua)
+        RHUIManager.initial_run(connection)
+        RHUIManager.release(connection)
+        seconds, cpu_seconds = measure(operation, connection, *opargs)
+        print("%-10s %8s %8s %12.4f %12.4f %12.4f" % (name, count, latency, seconds, cpu_seconds,
+                                                       seconds * 1000 / max(count, 1)))